@@ -2,45 +2,277 @@ import streamlit as st
 import os
 import pandas as pd
 import base64
-from data_utils import process_chain_data
+import uuid
+import data_utils as du
+import index_utils as iu
+import trace_utils as tr
 import visual_utils as vis
+import snapshot_utils as su
+import report_utils as ru
+from streamlit.errors import StreamlitAPIException
 
 st.set_page_config(page_title="绵阳产业链数字化画像看板", layout="wide")
+tr.tracer.begin_rerun(st.session_state.setdefault("trace_session", uuid.uuid4().hex))
 
 # 获取当前脚本所在的绝对路径
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
+CACHE_DIR = os.path.join(BASE_DIR, ".cache")
+SNAPSHOT_DIR = os.path.join(BASE_DIR, "snapshots")
+REPORT_SOURCES = (os.path.join(BASE_DIR, "report.md"), os.path.join(BASE_DIR, "reports"))
+CASE_CLUSTER = "科技机器人类"
 SPECIAL_5 = ["科技光子类", "科技低空类", "科技绿能类", "科技核医疗类", "科技机器人类"]
 
-@st.cache_data
-def load_all_data(dir):
-    files = [f for f in os.listdir(dir) if f.endswith(".xlsx") and not f.startswith("~$")]
-    all_raw, mets = [], []
-    for f in files:
-        name = f.replace(".xlsx", "")
-        df_tmp = process_chain_data(pd.read_excel(os.path.join(dir, f)))
-        mets.append({"产业名称": name, "企业数量": df_tmp['公司名称'].nunique(), "平均资质数": df_tmp['资质总量_f'].mean(), "分类": "重点产业" if name in SPECIAL_5 else "其他产业"})
-        df_tmp['所属产业集群'] = name
-        all_raw.append(df_tmp)
-    return pd.concat(all_raw, ignore_index=True), pd.DataFrame(mets)
+@st.cache_resource
+def loaded_stores():
+    """已构建的数据目录视图（目录 → ChainStore）：报告页等不依赖产业数据的页面借此判断数据是否已载入，不触发载入"""
+    return {}
+
+@st.cache_resource
+def data_store(dir):
+    """数据目录增量视图（进程内共享）：新增 / 修改 / 删除工作簿时只重新解析变化的文件"""
+    store = du.ChainStore(dir, SPECIAL_5, cache_dir=CACHE_DIR, compact=True)
+    loaded_stores()[dir] = store
+    return store
+
+def data_version(dir):
+    """轮询数据目录（按 DATA_WATCH_INTERVAL 节流），返回当前数据版本号"""
+    store = data_store(dir)
+    if store.refresh():
+        delta = store.changes[store.version]
+        st.toast(f"🔄 数据已更新：新增 {len(delta['added'])} / 修改 {len(delta['modified'])} / 删除 {len(delta['removed'])} 个工作簿")
+    return store.version
+
+def has_data(dir):
+    """是否已载入过产业数据（启动时数据目录为空则为 False；之后清空目录会保留上一版本）"""
+    return data_store(dir).df_all is not None
+
+# 以下资源均以 (目录, 数据版本) 为键：数据变化后旧版本条目自然淘汰，图像缓存按内容寻址不受影响
+@st.cache_resource(max_entries=2)
+def load_shared(dir, version):
+    """只读共享数据（进程内共享）：各会话引用同一份数据表，不再像 st.cache_data 那样逐次反序列化副本"""
+    _, df_all, df_mets = data_store(dir).snapshot()
+    with tr.span("build_company_index", "index_utils"):
+        companies = iu.CompanyIndex(df_all)
+    with tr.span("build_shared", "data_utils"):
+        return du.build_shared(df_all, df_mets, companies)
+
+def load_all_data(dir, version):
+    shared = load_shared(dir, version)
+    return shared.df_all, shared.df_mets
+
+def load_company_index(dir, version):
+    """企业索引：名称 → 行位置 / 所属产业，去重视图与名称检索（随共享数据一同构建）"""
+    return load_shared(dir, version).companies
+
+@st.cache_resource(max_entries=2)
+def load_cubes(dir, version):
+    """聚合立方体：全量 (企业, 产业) 行与按公司去重后的企业各一份（进程内共享）"""
+    shared = load_shared(dir, version)
+    with tr.span("build_cubes", "data_utils"):
+        return du.AggregateCube(shared.df_all), du.AggregateCube(shared.dedup)
+
+@st.cache_resource(max_entries=2)
+def load_profiles(dir, version):
+    """全部产业的深度解析素材（进程内共享，切换产业不再读盘；数据更新时只重建变化的产业）"""
+    df_all, _ = load_all_data(dir, version)
+    return data_store(dir).profiles(df_all, load_cubes(dir, version)[0])
+
+@st.cache_resource(max_entries=2)
+def load_risk_index(dir, version):
+    """全市风险位图索引（进程内共享）"""
+    df_all, _ = load_all_data(dir, version)
+    with tr.span("build_risk_index", "index_utils"):
+        return iu.RiskIndex(df_all)
+
+@st.cache_resource(max_entries=2)
+def load_filter_index(dir, version):
+    """交互筛选引擎（维度位图 + 得分排序索引，进程内共享）"""
+    df_all, _ = load_all_data(dir, version)
+    with tr.span("build_filter_index", "index_utils"):
+        return iu.FilterIndex(df_all)
+
+def filter_panel(fx):
+    """侧边栏筛选条件；未选择的维度不做限制"""
+    state = {}
+    with st.sidebar.expander("🎛️ 筛选条件"):
+        for dim in iu.FILTER_DIMS:
+            state[dim] = st.multiselect(dim, fx.values(dim), key=f"filter_{dim}")
+        for col in du.SCORE_COLS:
+            lo, hi = fx.bounds(col)
+            if lo < hi:
+                state[col] = st.slider(col, lo, hi, (lo, hi), key=f"filter_{col}")
+        st.caption("图表不受自身维度上的筛选影响（如规模饼图不随“企业划型名称”筛选变化），便于对照。")
+    return state
+
+@st.cache_resource(max_entries=2)
+def load_overlap(dir, version):
+    """企业 × 产业稀疏关联矩阵及产业重叠统计（进程内共享）"""
+    df_all, _ = load_all_data(dir, version)
+    with tr.span("build_overlap", "index_utils"):
+        return iu.ClusterOverlap(df_all)
+
+@st.cache_resource(max_entries=2)
+def load_ranking(dir, version):
+    """综合得分排名引擎（进程内共享，榜单按权重缓存）"""
+    df_all, _ = load_all_data(dir, version)
+    with tr.span("build_ranking", "index_utils"):
+        return iu.RankingEngine(df_all, load_company_index(dir, version).first_positions())
+
+@st.cache_resource
+def load_snapshot_store(dir):
+    """数据版本快照库（进程内共享，差异结果按快照对缓存）"""
+    return su.SnapshotStore(dir)
+
+def report_signature(sources):
+    """报告目录的廉价签名（文件名 + 大小 + 修改时间）：新增或更新报告后索引自动重建"""
+    sig = []
+    for src in sources:
+        entries = os.scandir(src) if os.path.isdir(src) else ([src] if os.path.exists(src) else [])
+        for e in entries:
+            st_ = os.stat(e)
+            sig.append((getattr(e, "name", e), st_.st_size, st_.st_mtime_ns))
+    return tuple(sorted(sig))
+
+@st.cache_resource(max_entries=2)
+def load_report_library(sources, signature, version):
+    """报告库：元数据索引 + 全文倒排表（逐页文本缓存在 .cache/reports，只重新抽取变化的报告）。
+
+    version 为 None 表示产业数据尚未载入：此时不补全产业 / 区县，载入后以新版本号重建。
+    """
+    companies = load_company_index(DATA_DIR, version) if version is not None and has_data(DATA_DIR) else None
+    return ru.ReportLibrary(list(sources), os.path.join(CACHE_DIR, "reports"), companies)
+
+def pdf_view(data):
+    """PDF 查看器：优先 st.pdf（需 streamlit[pdf]），否则以内嵌 iframe 展示"""
+    try:
+        st.pdf(data, height=800)
+    except StreamlitAPIException:
+        b64 = base64.b64encode(data).decode()
+        st.markdown(f'<iframe src="data:application/pdf;base64,{b64}" width="100%" height="800"></iframe>',
+                    unsafe_allow_html=True)
+
+def company_search(ci):
+    """侧边栏企业检索：名称前缀或任意片段，列出所属的全部产业"""
+    with st.sidebar.expander("🔍 企业检索"):
+        q = st.text_input("公司名称（前缀或任意片段）", key="company_query")
+        if q:
+            hits = ci.search(q)
+            st.caption(f"匹配企业 {len(hits)} 家（最多显示 20 家）")
+            if hits:
+                st.dataframe(ci.lookup(hits), hide_index=True)
+
+def r_of(fit):
+    return round(fit.r, 2) if fit else 'NA'
+
+def corr_level(fit):
+    """按 |R| 分档的相关性措辞，使解读文字与图中标注的 R 一致"""
+    r = abs(fit.r)
+    return "几乎无关" if r < 0.1 else "仅呈弱相关" if r < 0.3 else "呈中等相关" if r < 0.5 else "呈较强相关"
+
+STAGE_2 = "二、 第二阶段：核心指标联动分析"
+SCORE_LABELS = ['业务支撑指数', '技术护城河深度', '产品技术覆盖率']
+
+def render_stages(stage1, panes, lazy=True):
+    """深度解析分页：按需模式下只执行当前选中的分页，未展示分页的图表不计算"""
+    if lazy:
+        choice = st.radio("解析分页：", ["📋 全量背景画像", *panes], horizontal=True, key="deep_pane")
+        if choice not in panes:
+            return stage1()
+        st.subheader(STAGE_2)
+        return panes[choice]()
+    stage1()
+    st.subheader(STAGE_2)
+    for tab, pane in zip(st.tabs(list(panes)), panes.values()):
+        with tab: pane()
+
+def image(data, name="prerendered"):
+    with tr.span("st.image", "streamlit", func=name):
+        st.image(data, width="stretch")
+
+def show(plot_fn, *args, **kwargs):
+    """经图像缓存渲染图表；重复访问直接复用 PNG 字节"""
+    image(vis.render_cached(plot_fn, *args, **kwargs), plot_fn.__name__)
+
+def prerender(*tasks):
+    """并发渲染同一分页内互不依赖的图表（vis.task(...)），按页面顺序返回 PNG 字节，再逐个 image() 放置"""
+    return vis.render_many(tasks)
+
+def debug_panel():
+    """侧边栏性能调试面板：汇总本次（或全部）重跑的 span"""
+    if not st.sidebar.toggle("🛠️ 性能调试面板"):
+        return
+    with st.sidebar:
+        session, current = tr.tracer.current
+        rerun = current if st.radio("统计范围", ["本次重跑", "本会话全部重跑"], horizontal=True) == "本次重跑" else None
+        st.caption(f"重跑 #{current} · 图像缓存命中 {vis.figure_cache.hits} / 未命中 {vis.figure_cache.misses}"
+                   + (f" · 数据版本 #{DATA_VERSION}" if DATA_VERSION else "")
+                   + (" · 内存峰值已记录" if tr.tracer.memory else " · 内存峰值未记录（以 TRACE_MEMORY=1 启动服务开启）"))
+        st.dataframe(tr.tracer.summary(rerun, session), hide_index=True)
+        d1, d2 = st.columns(2)
+        d1.download_button("⬇️ JSON", tr.tracer.to_json(rerun, session), "trace.json", "application/json")
+        d2.download_button("⬇️ Chrome Trace", tr.tracer.to_chrome_trace(rerun, session), "trace.chrome.json", "application/json")
+
+def stop():
+    """提前结束本次重跑；先渲染调试面板，提前返回的重跑同样可以追踪"""
+    debug_panel()
+    st.stop()
 
 # --- 导航中心 ---
 st.sidebar.markdown("# 🛰️ 绵阳产业审计调度舱")
-selected_module = st.sidebar.radio("任务切换：", ["📍 绵阳企业产业分布一览", "🤖 机器人产业链案例解析", "📄 企业报告"])
-
-df_all, df_mets = load_all_data(DATA_DIR)
+DATA_VERSION = None
+selected_module = st.sidebar.radio("任务切换：", ["📍 绵阳企业产业分布一览", "🤖 产业链深度解析", "🗂️ 数据版本对比", "📄 企业报告"], key="module")
+if selected_module in ("📍 绵阳企业产业分布一览", "🤖 产业链深度解析"):
+    DATA_VERSION = data_version(DATA_DIR)
+    if not has_data(DATA_DIR):
+        st.error("❌ 未找到产业数据。请将各产业工作簿（.xlsx）放入 `data/` 目录，页面会自动载入。")
+        stop()
+    fx = load_filter_index(DATA_DIR, DATA_VERSION)
+    fstate = filter_panel(fx)
+    filtered = bool(fx.normalize(fstate))
+    companies = load_company_index(DATA_DIR, DATA_VERSION)
+    company_search(companies)
 
 # =================================================================
 # 模块 1：绵阳企业产业分布一览 (左图右文优化版)
 # =================================================================
 if selected_module == "📍 绵阳企业产业分布一览":
     st.title("🏙️ 绵阳全市企业产业分布一览")
-    df_u = df_all.drop_duplicates(subset=['公司名称'])
+    shared = load_shared(DATA_DIR, DATA_VERSION)
+    df_all, df_mets = shared.df_all, shared.df_mets
+    cube_all, cube_u = load_cubes(DATA_DIR, DATA_VERSION)
+
+    def view(chart=None, dedup=False):
+        """图表的筛选视图（按图表相关的筛选条件缓存）；无筛选时直接返回共享数据表"""
+        key = fx.normalize(fstate, chart)
+        if not key:
+            return shared.dedup if dedup else df_all
+        pos = fx.positions(fstate, chart)
+        if not dedup:
+            return fx.memo(('frame', key), lambda: df_all.iloc[pos])
+        return fx.memo(('dedup', key), lambda: df_all.iloc[companies.first_positions(pos)])
+
+    def filtered_mets():
+        """筛选后各产业的企业数量与平均资质数"""
+        def build():
+            g = view().groupby('所属产业集群', observed=True)
+            out = df_mets.set_index('产业名称')
+            out['企业数量'] = g['公司名称'].nunique().reindex(out.index, fill_value=0)
+            out['平均资质数'] = g['资质总量_f'].mean().reindex(out.index)
+            return out.reset_index()
+        return fx.memo(('mets', fx.normalize(fstate)), build)
+
+    if filtered and view().empty:
+        st.warning("当前筛选条件下没有企业，请放宽筛选条件。")
+        stop()
+    if filtered:
+        st.info(f"已应用筛选（{len(view(dedup=True))} 家企业）：图表随筛选实时更新，文字解读基于全量数据。")
+        df_mets = filtered_mets()
 
     # --- 1. 企业数量分布 ---
     col1, col2 = st.columns([1.5, 1])
     with col1:
-        st.pyplot(vis.plot_mianyang_ranking(df_mets, "企业数量", "1. 企业数量分布（产业规模格局）"))
+        show(vis.plot_mianyang_ranking, df_mets, "企业数量", "1. 企业数量分布（产业规模格局）")
     with col2:
         st.markdown("""
         - **核心发现**：绵阳产业呈现 **“基础雄厚、重点突出、新兴崛起”** 的格局。
@@ -55,7 +287,7 @@ if selected_module == "📍 绵阳企业产业分布一览":
     # --- 2. 平均资质数分布 ---
     col3, col4 = st.columns([1.5, 1])
     with col3:
-        st.pyplot(vis.plot_mianyang_ranking(df_mets, "平均资质数", "2. 平均资质数分布（企业获得资质荣誉称号数量）"))
+        show(vis.plot_mianyang_ranking, df_mets, "平均资质数", "2. 平均资质数分布（企业获得资质荣誉称号数量）")
     with col4:
         st.markdown("""
         - **核心发现**：企业“软实力”（企业资质总量：获得资质荣誉数目）与产业“硬科技”属性相关，**高端制造与精密技术产业普遍获得更多地荣誉资质**。
@@ -73,7 +305,10 @@ if selected_module == "📍 绵阳企业产业分布一览":
     # --- 3. 重点科技产业之区县分布 ---
     col5, col6 = st.columns([1.5, 1])
     with col5:
-        st.pyplot(vis.plot_special_geo_stacked(df_all, SPECIAL_5))
+        if filtered:
+            show(vis.plot_special_geo_stacked, view(), SPECIAL_5)
+        else:
+            show(vis.plot_special_geo_stacked, None, SPECIAL_5, counts=cube_all.counts(['区县', '所属产业集群'], 所属产业集群=SPECIAL_5).unstack())
     with col6:
         st.markdown("""
         -  **分布特征：极度集聚** - **绝对3核**：所有产业在 **涪城区** 遥遥领先，占绝大多数。**游仙区、安州区** 的企业数量也相对较多，3者合计占比预计超过70% 。其中涪城区在各个重点关注领域的企业数目都客观，但核医疗企业相对较多的集中在游仙区 。
@@ -87,7 +322,8 @@ if selected_module == "📍 绵阳企业产业分布一览":
     # --- 4. 规模结构 ---
     col7, col8 = st.columns([1.2, 1])
     with col7:
-        st.pyplot(vis.plot_scale_pie(df_u, "4. 全市企业规模结构"))
+        show(vis.plot_scale_pie, None, "4. 全市企业规模结构",
+             counts=view('plot_scale_pie', dedup=True)['企业划型名称'].value_counts().loc[lambda v: v > 0] if filtered else cube_u.counts('企业划型名称'))
     with col8:
         st.markdown("""
         #### **1. 企业规模结构**
@@ -98,7 +334,8 @@ if selected_module == "📍 绵阳企业产业分布一览":
     # --- 5. 地理分布 ---
     col9, col10 = st.columns([1.2, 1])
     with col9:
-        st.pyplot(vis.plot_region_bar(df_u, "5. 全市企业地理聚集情况"))
+        show(vis.plot_region_bar, None, "5. 全市企业地理聚集情况",
+             counts=view('plot_region_bar', dedup=True)['区县'].value_counts().loc[lambda v: v > 0] if filtered else cube_u.counts('区县'))
     with col10:
         st.markdown("""
         #### **2. 地理分布**
@@ -109,159 +346,235 @@ if selected_module == "📍 绵阳企业产业分布一览":
     # --- 6. 年限分布 ---
     col11, col12 = st.columns([1.2, 1])
     with col11:
-        st.pyplot(vis.plot_age_dist(df_u, "6. 全市企业成立年限分布"))
+        age_hist = fx.memo(('age_hist', fx.normalize(fstate, 'plot_age_dist')),
+                           lambda: du.hist_kde(view('plot_age_dist', dedup=True)['企业年限']))
+        show(vis.plot_age_dist, None, "6. 全市企业成立年限分布", dist=age_hist)
     with col12:
         st.markdown("""
         #### **3. 成立年限分布**
         企业数量随成立年限增加而 **快速递减**，成立时间短的企业占绝大多数。
         全市企业群体 **年轻化** 特征突出，反映经济活力，但也意味着大量企业缺乏长期信用记录和周期考验， **评估时需侧重成长性与技术潜力，而非历史财务数据**。
         """)
+    st.divider()
+
+    # --- 7. 产业交叉重叠 ---
+    overlap = fx.memo(('overlap', fx.normalize(fstate)), lambda: iu.ClusterOverlap(view())) if filtered else load_overlap(DATA_DIR, DATA_VERSION)
+    col13, col14 = st.columns([1.5, 1])
+    with col13:
+        metric = st.radio("重叠口径：", ["共有企业数", "Jaccard 相似度"], horizontal=True, key="overlap_metric")
+        if metric == "共有企业数":
+            show(vis.plot_overlap_heatmap, overlap.counts, "7. 产业交叉重叠（共有企业数）")
+        else:
+            show(vis.plot_overlap_heatmap, overlap.jaccard.round(2), "7. 产业交叉重叠（Jaccard 相似度）", fmt='.2f')
+    with col14:
+        multi = overlap.memberships()
+        pairs = "\n".join(f"  - {a} × {b}：{n} 家" for a, b, n in overlap.top_pairs(5))
+        st.markdown(f"""
+#### **4. 产业交叉重叠**
+同时出现在两个及以上产业中的企业共 **{int(multi[multi.index > 1].sum())} 家**（占 {multi[multi.index > 1].sum() / max(multi.sum(), 1):.1%}）。
+- 共有企业最多的产业组合：
+{pairs}
+- 对角线为各产业企业数；Jaccard 相似度接近 1 的两个产业名单高度重合，可合并研判，避免重复走访。
+""")
     st.warning("**阶段总结**：基于全部分析，绵阳市呈现 **“小微、年轻、高集聚”** 的鲜明特征。")
 
 # =================================================================
-# 模块 4：机器人产业链案例解析 (左图右文优化版)
+# 模块 4：产业链深度解析（默认机器人案例，可切换任一产业）
 # =================================================================
-elif selected_module == "🤖 机器人产业链案例解析":
-    st.title("🤖 机器人产业链——深度穿透解析案例")
-    df_robot = process_chain_data(pd.read_excel(os.path.join(DATA_DIR, "科技机器人类.xlsx")))
-    df_p = df_robot[df_robot['专利数量_f'] > 0].copy()
-
-    st.subheader("一、 第一阶段：全量背景画像分析")
+elif selected_module == "🤖 产业链深度解析":
+    profiles = load_profiles(DATA_DIR, DATA_VERSION)
+    names = list(profiles)
+    cluster = st.sidebar.selectbox("解析产业：", names, index=names.index(CASE_CLUSTER) if CASE_CLUSTER in names else 0)
+    lazy = st.sidebar.toggle("⚡ 按需渲染", value=True, key="lazy_render", help="开启后分页展示，仅计算当前分页的图表；关闭则整页一次性渲染")
+    df_all, _ = load_all_data(DATA_DIR, DATA_VERSION)
+    full = profiles[cluster]
+
+    def P(chart=None):
+        """图表所用的产业画像：未筛选时为预计算画像，否则为筛选子集的画像（按图表相关的筛选条件缓存）"""
+        key = fx.normalize(fstate, chart)
+        if not key:
+            return full
+        return fx.memo(('profile', cluster, key),
+                       lambda: du.build_cluster_profile(df_all, cluster, fx.positions(fstate, chart, full.rows)))
+
+    prof = P()
+    df_c, df_p = prof.df, prof.df_p
+    is_case = cluster == CASE_CLUSTER
+    narrate = is_case and not filtered
+
+    def note(text):
+        # 解读文字基于科技机器人类样本撰写，仅在案例产业下展示
+        if narrate: st.markdown(text)
+
+    def conclude(text):
+        if narrate: st.success(text)
+
+    st.title(f"🤖 {cluster}产业链——深度穿透解析" + ("案例" if is_case else ""))
+    if not is_case:
+        st.info(f"以下图表基于{cluster}数据实时生成；文字解读为科技机器人类案例专属，此处不展示。")
+    elif filtered:
+        st.info("已应用筛选：图表随筛选实时更新；文字解读基于全量数据，此处不展示。")
+
+    def stage_background():
+        st.subheader("一、 第一阶段：全量背景画像分析")
     
-    # --- 规模 ---
-    c1, c2 = st.columns([1.2, 1])
-    with c1: st.pyplot(vis.plot_scale_pie(df_robot, "科技机器人类企业规模分布"))
-    with c2:
-        st.markdown("""
-        - **结构特征**：微型（64.7%）与小型（29.5%）企业合计占比超 **93%**，表明产业 **创新活跃但格局分散**，尚未形成由大型龙头主导的成熟集群。
-        - **业务实质**：这反映出本地产业仍以 **初创型、专业化项目** 为主，整体处于技术孵化与市场探索期。
-        """)
-        st.success("**阶段总结**：产业基础广泛，但需识别并助力潜在骨干企业成长，以提升集群稳定性。")
-    st.divider()
+        # --- 规模 ---
+        c1, c2 = st.columns([1.2, 1])
+        with c1: show(vis.plot_scale_pie, None, f"{cluster}企业规模分布", counts=P('plot_scale_pie').scale_counts)
+        with c2:
+            note("""
+            - **结构特征**：微型（64.7%）与小型（29.5%）企业合计占比超 **93%**，表明产业 **创新活跃但格局分散**，尚未形成由大型龙头主导的成熟集群。
+            - **业务实质**：这反映出本地产业仍以 **初创型、专业化项目** 为主，整体处于技术孵化与市场探索期。
+            """)
+            conclude("**阶段总结**：产业基础广泛，但需识别并助力潜在骨干企业成长，以提升集群稳定性。")
+        st.divider()
 
-    # --- 资本 ---
-    c3, c4 = st.columns([1.2, 1])
-    with c3: st.pyplot(vis.plot_capital_dist(df_robot))
-    with c4:
-        st.markdown("""
-        - **结构特征**：超八成企业（150家）注册资本在 **1000万元以下**，其中100-500万区间最为集中（80多家）。这与“小微企业主导”的规模结构相互印证，表明多数企业处于 **轻资产运营** 的初创或成长阶段。
-        - **实力分层**：注册资本在 **5000万元以上的企业仅10多家**（占约6%），说明产业头部力量仍较薄弱，缺乏资本雄厚的大型领军企业。
-        """)
-        st.success("**阶段总结**：产业资本基础以中小规模为主，避免因“小资本”而低估优质技术型企业的潜力。")
-    st.divider()
+        # --- 资本 ---
+        c3, c4 = st.columns([1.2, 1])
+        with c3: show(vis.plot_capital_dist, None, counts=P('plot_capital_dist').capital_counts)
+        with c4:
+            note("""
+            - **结构特征**：超八成企业（150家）注册资本在 **1000万元以下**，其中100-500万区间最为集中（80多家）。这与“小微企业主导”的规模结构相互印证，表明多数企业处于 **轻资产运营** 的初创或成长阶段。
+            - **实力分层**：注册资本在 **5000万元以上的企业仅10多家**（占约6%），说明产业头部力量仍较薄弱，缺乏资本雄厚的大型领军企业。
+            """)
+            conclude("**阶段总结**：产业资本基础以中小规模为主，避免因“小资本”而低估优质技术型企业的潜力。")
+        st.divider()
 
-    # --- 成立年限 ---
-    c5, c6 = st.columns([1.2, 1])
-    with c5: st.pyplot(vis.plot_age_dist(df_robot, "科技机器人类企业成立年限分布"))
-    with c6:
-        st.markdown("""
-        - **行业阶段**：绝大多数企业成立年限 **以0-5年为主，大多在15年以内**，表明该产业的企业是在近年政策与技术驱动下 **快速形成的新兴集群**，而非传统产业升级。
-        -  **1**：大量年轻企业意味着 **缺乏长期信用记录** 与 **完整经济周期考验**，需要审慎看待经营不确定性。
-        -  **2**：这恰好对应了企业的 **早期融资需求窗口**。若能挖掘高技术价值的企业，可抢占先机，培育未来核心客户。
-        - **交叉验证**：此特征与前两张图的“小微主体”、“轻资本”结构高度一致，共同印证产业处于 **初创期**。
-        """)
-        st.success("**阶段总结**：产业年轻充满活力，但评估侧重点可以从“看历史”转向“评未来”，重点考察其技术护城河等技术性方面。")
-    st.divider()
+        # --- 成立年限 ---
+        c5, c6 = st.columns([1.2, 1])
+        with c5: show(vis.plot_age_dist, None, f"{cluster}企业成立年限分布", dist=P('plot_age_dist').dists.age)
+        with c6:
+            note("""
+            - **行业阶段**：绝大多数企业成立年限 **以0-5年为主，大多在15年以内**，表明该产业的企业是在近年政策与技术驱动下 **快速形成的新兴集群**，而非传统产业升级。
+            -  **1**：大量年轻企业意味着 **缺乏长期信用记录** 与 **完整经济周期考验**，需要审慎看待经营不确定性。
+            -  **2**：这恰好对应了企业的 **早期融资需求窗口**。若能挖掘高技术价值的企业，可抢占先机，培育未来核心客户。
+            - **交叉验证**：此特征与前两张图的“小微主体”、“轻资本”结构高度一致，共同印证产业处于 **初创期**。
+            """)
+            conclude("**阶段总结**：产业年轻充满活力，但评估侧重点可以从“看历史”转向“评未来”，重点考察其技术护城河等技术性方面。")
+        st.divider()
 
-    # --- 风险 ---
-    c7, c8 = st.columns([1.2, 1])
-    with c7: st.pyplot(vis.plot_risk_barh(df_robot))
-    with c8:
-        st.markdown("**风险企业极少**：属于该类别的企业总共20多家，“被执行人”（11家）、“行政处罚”（10家）、“失信被执行人”（1家）占比极低。")
-        st.success("**阶段总结**：说明大多数企业目前都是**经营合规**，可靠性比较稳定。")
-    st.divider()
+        # --- 风险 ---
+        c7, c8 = st.columns([1.2, 1])
+        risk_index = load_risk_index(DATA_DIR, DATA_VERSION)
+        with c7: show(vis.plot_risk_barh, None, counts=risk_index.counts(prof.rows))
+        with c8:
+            note("**风险企业极少**：属于该类别的企业总共20多家，“被执行人”（11家）、“行政处罚”（10家）、“失信被执行人”（1家）占比极低。")
+            conclude("**阶段总结**：说明大多数企业目前都是**经营合规**，可靠性比较稳定。")
+            with st.expander("🔎 风险组合筛查"):
+                r1, r2, r3 = st.columns(3)
+                any_r = r1.multiselect("命中任一", du.RISK_COLS)
+                all_r = r2.multiselect("同时命中", du.RISK_COLS)
+                none_r = r3.multiselect("均未命中", du.RISK_COLS)
+                hit = risk_index.query(any_r, all_r, none_r)[prof.rows]
+                st.caption(f"符合条件的企业：{int(hit.sum())} 家")
+                if any_r or all_r or none_r:
+                    st.dataframe(df_c.loc[hit, ['公司名称', '区县', '企业划型名称']], hide_index=True)
+                st.markdown("**风险项共现矩阵**")
+                st.dataframe(risk_index.cooccurrence(prof.rows))
+        st.divider()
 
-    # --- 资质 ---
-    c9, c10 = st.columns([1.2, 1])
-    with c9: st.pyplot(vis.plot_qual_dist(df_robot))
-    with c10:
-        st.markdown("""
-        1. **整体薄弱**：（资质总量是企业获得的荣誉称号的数量）多数企业集中于资质数量15项以内，表明 **对于中小型为多的新企业来，荣誉称号数量不多但尚可**，整体产业形象与品牌建设处于早期。
-        2. **分化明显**：少量企业拥有较多资质荣誉称号，反映出 **政策资源与认可度集中于少数企业**。
-        """)
-        st.success("**阶段总结**：产业整体荣誉资质积累有待提高，可以重点关注那些兼具高资质与高技术指标的优质企业。")
-    st.divider()
+        # --- 资质 ---
+        c9, c10 = st.columns([1.2, 1])
+        with c9: show(vis.plot_qual_dist, None, dist=prof.dists.qual)
+        with c10:
+            note("""
+            1. **整体薄弱**：（资质总量是企业获得的荣誉称号的数量）多数企业集中于资质数量15项以内，表明 **对于中小型为多的新企业来，荣誉称号数量不多但尚可**，整体产业形象与品牌建设处于早期。
+            2. **分化明显**：少量企业拥有较多资质荣誉称号，反映出 **政策资源与认可度集中于少数企业**。
+            """)
+            conclude("**阶段总结**：产业整体荣誉资质积累有待提高，可以重点关注那些兼具高资质与高技术指标的优质企业。")
+        st.divider()
 
-    # --- 地理分布 ---
-    c11, c12 = st.columns([1.2, 1])
-    with c11: st.pyplot(vis.plot_region_bar(df_robot, "科技机器人类企业区县分布"))
-    with c12:
-        st.markdown("""
-        1. **格局集中**：仅 **涪城区+游仙区+安州区（200多家）** 便汇聚了几乎所有的企业，占比远超其他区的总和，表明产业资源、人才与政策高度集中于城市核心区。
-        2. **区域失衡**：其余区县企业数量占比少，反映出产业辐射与扩散能力 **有待提升**，区域协同发展格局有待进一步构建。
-        """)
-        st.success("**阶段总结**：产业地理分布高度集中，可以采取“聚焦核心涪城区、同时关注其他梯队”的区域策略，可关注游仙区、安州区等第二梯队中具有技术特色的企业，进行前瞻性布局，以分散区域风险。")
-    st.divider()
+        # --- 地理分布 ---
+        c11, c12 = st.columns([1.2, 1])
+        with c11: show(vis.plot_region_bar, None, f"{cluster}企业区县分布", counts=P('plot_region_bar').region_counts)
+        with c12:
+            note("""
+            1. **格局集中**：仅 **涪城区+游仙区+安州区（200多家）** 便汇聚了几乎所有的企业，占比远超其他区的总和，表明产业资源、人才与政策高度集中于城市核心区。
+            2. **区域失衡**：其余区县企业数量占比少，反映出产业辐射与扩散能力 **有待提升**，区域协同发展格局有待进一步构建。
+            """)
+            conclude("**阶段总结**：产业地理分布高度集中，可以采取“聚焦核心涪城区、同时关注其他梯队”的区域策略，可关注游仙区、安州区等第二梯队中具有技术特色的企业，进行前瞻性布局，以分散区域风险。")
+        st.divider()
 
-   
-    # --- 第二阶段 ---
-    st.subheader("二、 第二阶段：核心指标联动分析")
-    stabs = st.tabs(["📊 指标联动", "🫧 研发聚焦", "💰 资本审美", "🕒 年限演进"])
+    def pane_linkage():
+        violins = P('plot_metric_violin').dists.violins
+        imgs = prerender(*(t for col, label in zip(du.SCORE_COLS, SCORE_LABELS) for t in (
+            vis.task(vis.plot_metric_trend, df_p, col, label, r_of(prof.fits[col])),
+            vis.task(vis.plot_metric_violin, None, col, label, stats=violins[col]))))
+
+        def patent_note(col, label, weak_text):
+            # 相关强度与 R 取自当前数据的拟合；弱相关时才给出“专利多不等于技术强”一类结论
+            fit = prof.fits[col]
+            if fit is None:
+                return note(f"- **核心发现**：有专利的企业样本不足，无法判断专利数量与{label}的相关性。")
+            head = f"- **核心发现**：专利数量与{label}**{corr_level(fit)}（R={r_of(fit)}）**。"
+            if abs(fit.r) >= 0.3:
+                trend = "越高" if fit.r > 0 else "越低"
+                weak_text = f"专利越多的企业{label}总体{trend}，但散点仍较离散：专利数量可作为初筛参考，最终以{label}得分本身为准。"
+            note(head + weak_text)
 
-    with stabs[0]:
         # 1. 业务支撑指数
         st.markdown("#### **1. 业务支撑指数**")
         c1a, c1b = st.columns(2)
         with c1a: 
-            st.pyplot(vis.plot_metric_trend(df_p, '支撑得分', '业务支撑指数', 0.31))
-            st.markdown("""
-            - **核心发现**：专利数量与业务支撑指数**仅呈弱相关（R=0.31）**。大量专利（横坐标右侧）并未带来相应的高支撑得分，反之，部分专利不多的企业却得分很高。这直接**戳破了“专利多等于技术强”的误区**。需警惕 **“专利泡沫”**（即专利数量庞大但与本业关联度低），这类企业研发可能不够聚焦
-        """)
+            image(imgs[0])
+            patent_note(du.SCORE_COLS[0], SCORE_LABELS[0],
+                        "大量专利（横坐标右侧）并未带来相应的高支撑得分，反之，部分专利不多的企业却得分很高。这直接**戳破了“专利多等于技术强”的误区**。需警惕 **“专利泡沫”**（即专利数量庞大但与本业关联度低），这类企业研发可能不够聚焦。")
         with c1b: 
-            st.pyplot(vis.plot_metric_violin(df_p, '支撑得分', '业务支撑指数'))
-            st.markdown("""
+            image(imgs[1])
+            note("""
             - **核心发现**：不同规模企业的业务支撑指数**分布高度重叠且离散**。相对而言，规模越大平均得分越高，但是大型企业得分并非全部领先，而众多**微型、小型企业中不乏高分群体**，企业规模并非技术变现能力的可靠保证，传统基于企业规模的判别方式可能**漏掉优质中小企业**。
         """)
-        st.success("**阶段总结**：利用“业务支撑指数”快速识别两类企业：1）研发高度聚焦、变现路径清晰的核心客群（无论规模大小，看支撑度）；2）专利虽多但偏离主业、研发效率可疑的需警惕对象。优先支持各规模段中得分领先的企业，尤其是中小微企业中的高分者，它们可能是成长性最佳的目标。")
+        conclude("**阶段总结**：利用“业务支撑指数”快速识别两类企业：1）研发高度聚焦、变现路径清晰的核心客群（无论规模大小，看支撑度）；2）专利虽多但偏离主业、研发效率可疑的需警惕对象。优先支持各规模段中得分领先的企业，尤其是中小微企业中的高分者，它们可能是成长性最佳的目标。")
         st.divider() 
 
         # 2. 技术护城河
         st.markdown("#### **2. 技术护城河深度**")
         c2a, c2b = st.columns(2)
         with c2a: 
-            st.pyplot(vis.plot_metric_trend(df_p, '护城河得分', '技术护城河深度', 0.14))
-            st.markdown("""
-            - **核心发现**：两者几乎无关（R=0.14）。图表中大量专利堆砌（右侧）未能推高护城河得分，而一些专利量中等的企业（中间区域）反而得分突出， **“专利质量”比“专利数量”更能构筑壁垒**。
+            image(imgs[2])
+            patent_note(du.SCORE_COLS[1], SCORE_LABELS[1],
+                        "图表中大量专利堆砌（右侧）未能推高护城河得分，而一些专利量中等的企业（中间区域）反而得分突出， **“专利质量”比“专利数量”更能构筑壁垒**。")
+            note("""
             - **注意**：重点关注**护城河得分高的企业**，无论其专利总数多少。这代表了它们在特定技术点上已建立起 **“非对称优势”** ，具备抗风险能力。
         """)
         with c2b: 
-            st.pyplot(vis.plot_metric_violin(df_p, '护城河得分', '技术护城河深度'))
-            st.markdown("""
+            image(imgs[3])
+            note("""
         - **核心发现**：大型企业并未垄断高分，中小型企业中出现了一批“细分领域技术领先者”。因此，企业规模并不完全等同于技术壁垒，可以在中小规模的企业里找到一些深厚壁垒的“隐形冠军”。
         """)
-        st.success("**阶段总结**：对得分高的企业，即使其规模不大或财务历史较短，也可以作为重点关注对象，因为其核心技术构成了强大的竞争优势。可将“技术护城河深度”作为发掘 **“专精特新”潜力股的辅助筛选工具**，关注中小微企业中该指标得分靠前的企业，它们具备高成长性。")
+        conclude("**阶段总结**：对得分高的企业，即使其规模不大或财务历史较短，也可以作为重点关注对象，因为其核心技术构成了强大的竞争优势。可将“技术护城河深度”作为发掘 **“专精特新”潜力股的辅助筛选工具**，关注中小微企业中该指标得分靠前的企业，它们具备高成长性。")
         st.divider()
 
         # 3. 产品技术覆盖率
         st.markdown("#### **3. 产品技术覆盖率**")
         c3a, c3b = st.columns(2)
         with c3a: 
-            st.pyplot(vis.plot_metric_trend(df_p, '覆盖得分', '产品技术覆盖率', 0.02))
-            st.markdown("""
+            image(imgs[4])
+            note("""
             - **核心发现**：拥有大量专利的极个别企业产品覆盖度可能相对较低（大而不精），其产品可能仍存在无有效专利保护的缺口，存在专利布局的战略改进点。同时也说明专利再多，若未有效覆盖核心产品，则企业经营存在被竞争对手轻易模仿或攻击的 **高风险点**。
         """)
         with c3b: 
-            st.pyplot(vis.plot_metric_violin(df_p, '覆盖得分', '产品技术覆盖率'))
-            st.markdown("""
+            image(imgs[5])
+            note("""
             - **核心发现**：
             - **大型企业**：整体得分相对集中趋于60分，整体较高，但与中型企业差距不显著，即它的业务可能庞杂或依赖存在少数核心专利的情况，相对边缘的业务覆盖度不够，存在“灯下黑”风险，但其得分显著高于小型和微型企业，。
             - **小型企业（平均40分左右）**：处于高速成长期，对知识产权保护意识最强，是**风控与业务机会的平衡点**，存在少数优质企业覆盖度指标优异。
             - **微型企业（平均20分左右）**：资源有限，专利布局严重不足，生存根基不牢。
         """)
-        st.success("**阶段总结**：“产品技术覆盖率”是经营风险的“X光片”，可重点关注覆盖率高的小型和中型企业，它们增长意愿强且风控意识好。")
+        conclude("**阶段总结**：“产品技术覆盖率”是经营风险的“X光片”，可重点关注覆盖率高的小型和中型企业，它们增长意愿强且风控意识好。")
 
  
-    with stabs[1]:
+    def pane_focus():
         st.write("### 第三阶段：研发聚焦度 vs. 技术护城河深度")
         
         # 采用左图右文布局
         col_bub1, col_bub2 = st.columns([1.6, 1])
         
         with col_bub1:
-            st.pyplot(vis.plot_bubble_chart(df_p))
+            show(vis.plot_bubble_chart, df_p)
         
         with col_bub2:
-            st.markdown("""
+            note("""
 ##### **1. 直接表现**
 - 图表显示，**业务支撑指数（研发聚焦度）与技术护城河深度有一定的正相关趋势**（回归线向上），表明研发越聚焦的企业，可能在特定领域建立起深厚的技术壁垒。
 - 图中气泡大小（专利数量）分布不均：**中间靠右上的象限（双高区域）存在一些专利量较大的企业，但也不乏专利量中等或偏小的企业**；左下象限（双低区域）企业专利量普遍偏小。
@@ -273,23 +586,45 @@ elif selected_module == "🤖 机器人产业链案例解析":
             """)
         
         # 阶段总结保持全宽显示，作为本页结论
-        st.success("""**阶段总结**：此图与之前“专利数量与各指标弱相关”的结论一致：**专利数量（气泡大小）并非决定企业技术质量的核心因素**。右上象限不乏专利量不大但质量极高的企业。 结合“企业规模vs指标分布图”，这类双高企业可能分布于各个规模段，尤其值得在 **中小型** 企业中挖掘。
+        conclude("""**阶段总结**：**专利数量（气泡大小）并非决定企业技术质量的核心因素**。右上象限不乏专利量不大但质量极高的企业。 结合“企业规模vs指标分布图”，这类双高企业可能分布于各个规模段，尤其值得在 **中小型** 企业中挖掘。
         """)
+
+        # 右上象限企业清单：加权综合得分榜
+        st.markdown("#### 🏅 综合得分 Top-K 榜单")
+        ranking = load_ranking(DATA_DIR, DATA_VERSION)
+        with st.expander("⚖️ 权重设置"):
+            wcols = st.columns(len(iu.RANK_COLS))
+            weights = {c: wc.slider(c.removesuffix('_f'), 0.0, 1.0, iu.DEFAULT_WEIGHTS[c], 0.05, key=f"weight_{c}")
+                       for c, wc in zip(iu.RANK_COLS, wcols)}
+        k1, k2, k3 = st.columns([1.4, 1, 1])
+        scope = k1.radio("榜单范围：", ["本产业", "全市·按区县", "全市·按规模"], horizontal=True, key="rank_scope")
+        top_k = k3.slider("K", 5, 50, 10, key="rank_k")
+        if sum(weights.values()) <= 0:
+            st.warning("权重之和须大于 0。")
+        elif scope == "本产业":
+            st.dataframe(ranking.top_within(weights, prof.rows, top_k) if filtered
+                         else ranking.top(weights, '所属产业集群', cluster, top_k), hide_index=True)
+        else:
+            by = '区县' if scope == "全市·按区县" else '企业划型名称'
+            value = k2.selectbox(by, ranking.values(by), key=f"rank_{by}")
+            st.dataframe(ranking.top(weights, by, value, top_k), hide_index=True)
         
-    with stabs[2]:
+    def pane_funding():
         st.markdown("#### **评估资本市场对技术指标的筛选效应**")
+        imgs = prerender(*(vis.task(vis.plot_funding_box, P('plot_funding_box').df_p, col, label)
+                           for col, label in zip(du.SCORE_COLS, SCORE_LABELS)))
         c_f1, c_f2, c_f3 = st.columns(3)
         with c_f1: 
-            st.pyplot(vis.plot_funding_box(df_p, '支撑得分', '业务支撑指数'))
-            st.markdown("""
+            image(imgs[0])
+            note("""
             - **数据事实**：未获投企业的平均得分（50）显著高于获投企业（18）。
     
             - **客观解析**：这看似反直觉，但结合我们的样本结构（大量中小微企业）可推断：**本地多数技术扎实、研发高度聚焦的中小企业，尚未进入风险资本的视野**。资本市场可能更关注市场爆发力、团队背景或商业模式，而不仅仅看当前技术变现聚焦度。这揭示了 **“技术价值”与“资本价值”在当前本地市场存在认知错配或信息不对称**。
 
             - **总结**：可以**错位竞争**，利用“业务支撑指数”识别出这些**被VC忽略但技术路径清晰、经营稳健的“隐形优质企业”**.""")
         with c_f2: 
-            st.pyplot(vis.plot_funding_box(df_p, '护城河得分', '技术护城河深度'))
-            st.markdown("""
+            image(imgs[1])
+            note("""
             - **数据事实**：未获投企业平均分与获投企业的差距很小（获投的样极少）。
     
             - **客观解析**：两者分值接近且都处于中高水平，表明 **“建立技术壁垒”是本地技术型企业的普遍共识和共同优势**。
@@ -297,8 +632,8 @@ elif selected_module == "🤖 机器人产业链案例解析":
             - **总结**：可将“技术护城河深度”视为一个 **“基础资格线”** ，用于筛选掉技术壁垒薄弱的企业，辅助挑选最优质的企业.
             """)
         with c_f3: 
-            st.pyplot(vis.plot_funding_box(df_p, '覆盖得分', '产品技术覆盖率'))
-            st.markdown("""
+            image(imgs[2])
+            note("""
             - **数据事实**：获投企业平均分（60分）远超未获投企业平均分（35分左右），差距悬殊.
     
             - **客观解析**：可能表明，**“产品技术覆盖率”可作为风险管控指标参考**。投资者明确规避产品线存在“裸奔”风险的企业。
@@ -308,14 +643,19 @@ elif selected_module == "🤖 机器人产业链案例解析":
 
 
 
-    with stabs[3]:
+    def pane_age():
         st.markdown("### 指标随成立年限的动态演进")
+        rows, trends = P('plot_age_matrix_row'), P('plot_time_trend_sd').dists.trends
+        imgs = prerender(*[vis.task(vis.plot_age_matrix_row, None, col, label, means=rows.age_means[col], dists=rows.dists.age_rows[col])
+                           for col, label in zip(du.SCORE_COLS, SCORE_LABELS)],
+                         *[vis.task(vis.plot_time_trend_sd, None, col, label, color, band=trends[col])
+                           for col, label, color in zip(du.SCORE_COLS, SCORE_LABELS, ['royalblue', 'seagreen', 'orange'])])
         st.subheader("1. “老中青”分层对比分析")
         
         # --- 1. 业务支撑指数（研发聚焦度） ---
         st.markdown("#### **1. 业务支撑指数（研发聚焦度）**")
-        st.pyplot(vis.plot_age_matrix_row(df_p, '支撑得分', '业务支撑指数'))
-        st.markdown("""
+        image(imgs[0])
+        note("""
         - **客观事实**：**老牌企业**平均得分最高（68.9分），显著高于青年企业（31.7分）与中坚企业（36.7分）。
         
         - **解析** ：随着成立年限越久，企业逐渐度过摸索期，**研发方向逐渐聚焦于核心业务**，技术变现路径最清晰。
@@ -324,8 +664,8 @@ elif selected_module == "🤖 机器人产业链案例解析":
 
         # --- 2. 技术护城河深度 ---
         st.markdown("#### **2. 技术护城河深度**")
-        st.pyplot(vis.plot_age_matrix_row(df_p, '护城河得分', '技术护城河深度'))
-        st.markdown("""
+        image(imgs[1])
+        note("""
         - **客观事实**：**老牌企业**平均得分依然显著领先（77.8分），青年企业（63.6）与老牌企业（62.2）相对较低，且接近。
         
         - **解析**：老牌企业不仅聚焦主业，且**在特定技术点上建立的壁垒最深**，竞争优势和抗风险能力最强，当然老牌企业也可能面临技术迭代放缓的挑战，被后来的企业追赶。
@@ -334,14 +674,14 @@ elif selected_module == "🤖 机器人产业链案例解析":
 
         # --- 3. 产品技术覆盖率 ---
         st.markdown("#### **3. 产品技术覆盖率**")
-        st.pyplot(vis.plot_age_matrix_row(df_p, '覆盖得分', '产品技术覆盖率'))
-        st.markdown("""
+        image(imgs[2])
+        note("""
         - **客观事实**：**老牌企业（55.7分）**，**青年企业**（24分）与中坚企业（26分），明显更好但仍有提升空间。
         
         - **解析**：**青年企业和中坚的产品“裸奔”风险相对较高**，这是其经营短板。而**老牌企业**则更注重产品技术的完善，这也是其指标较高的原因。总体来看随着成立的成立时间越久，整体的指标分布逐渐**向高分转移**，企业对于自己的产品的技术支持逐渐成熟。
         """)
 
-        st.success("""**阶段总结**：**企业年龄**是解读其技术健康度的关键维度，但是并不是绝对代表成立年限越久地企业，其3个技术指标越高，在各指标维度仍然存在高分地中青企业。
+        conclude("""**阶段总结**：**企业年龄**是解读其技术健康度的关键维度，但是并不是绝对代表成立年限越久地企业，其3个技术指标越高，在各指标维度仍然存在高分地中青企业。
         """)
         
         st.divider()
@@ -350,8 +690,8 @@ elif selected_module == "🤖 机器人产业链案例解析":
 
         # --- 1. 业务支撑指数趋势（研发聚焦度） ---
         st.markdown("#### **1. 业务支撑指数趋势（研发聚焦度）**")
-        st.pyplot(vis.plot_time_trend_sd(df_p, '支撑得分', '业务支撑指数', 'royalblue'))
-        st.markdown("""
+        image(imgs[3])
+        note("""
         - **整体趋势**：得分随年限 **先快速上升后趋于平稳或缓慢回落**。在成立初期（0-5年）得分较低且波动大，表明研发方向处于探索期；在5-15年间持续攀升并达到高峰，研发向主业聚焦；15年后可能持平或小幅下降，部分企业或因业务多元化而分散聚焦度。
         
         - **解析**：企业的研发聚焦能力在 **成立6-15年间达到最佳状态**，这是支持其扩大再生产、提升市场占有率的黄金窗口期。
@@ -360,8 +700,8 @@ elif selected_module == "🤖 机器人产业链案例解析":
 
         # --- 2. 技术护城河深度趋势（壁垒强度） ---
         st.markdown("#### **2. 技术护城河深度趋势（壁垒强度）**")
-        st.pyplot(vis.plot_time_trend_sd(df_p, '护城河得分', '技术护城河深度', 'seagreen'))
-        st.markdown("""
+        image(imgs[4])
+        note("""
         - **整体趋势**：得分随年限 **稳步上升，尤其在10-15年间加速提升**，15年后增速放缓或进入平台期。表明技术壁垒的构建需要时间积累，中坚企业通过持续研发形成了深厚的集群优势.
         
         - **关键洞察**：**护城河的构建具有“时间复利”效应**。成立10年以上的企业往往在特定技术点上建立了实质性壁垒，抗风险能力强。
@@ -370,42 +710,123 @@ elif selected_module == "🤖 机器人产业链案例解析":
 
         # --- 3. 产品技术覆盖率趋势（风险覆盖） ---
         st.markdown("#### **3. 产品技术覆盖率趋势（风险覆盖）**")
-        st.pyplot(vis.plot_time_trend_sd(df_p, '覆盖得分', '产品技术覆盖率', 'orange'))
-        st.markdown("""
+        image(imgs[5])
+        note("""
         - **整体趋势**：得分随年限 **持续改善但增速递减**。青年企业（0-5年）覆盖率低且提升缓慢，中坚企业（6-15年）快速提升，15年后改善幅度变小。这表明知识产权布局意识随企业发展逐步增强，但早期欠缺较多。
         
         - **关键洞察**：**覆盖率是典型的“历史欠账”指标**。年轻企业普遍“裸奔”，而老牌企业虽有所改善，但可能仍有历史遗留的薄弱环节。
         """)
 
         # --- 第五阶段 最终总结 ---
-        st.success("""**阶段总结**：可以重点瞄准 **成立在6-15年的企业**，此时企业技术聚焦度与壁垒深度均处于上升通道，可以助推其突破成长瓶颈。对青年企业监控其覆盖率提升进度，对中坚企业关注其护城河深度变化，对老牌企业跟踪其业务支撑指数是否保持稳定。
+        conclude("""**阶段总结**：可以重点瞄准 **成立在6-15年的企业**，此时企业技术聚焦度与壁垒深度均处于上升通道，可以助推其突破成长瓶颈。对青年企业监控其覆盖率提升进度，对中坚企业关注其护城河深度变化，对老牌企业跟踪其业务支撑指数是否保持稳定。
         """)
+
+    if prof.df.empty:
+        st.warning("当前筛选条件下该产业没有企业，请放宽筛选条件。")
+    else:
+        render_stages(stage_background, {"📊 指标联动": pane_linkage, "🫧 研发聚焦": pane_focus,
+                                         "💰 资本审美": pane_funding, "🕒 年限演进": pane_age}, lazy)
         
 # =================================================================
-# 模块 3：企业专项审计报告（展示 Markdown 报告）
+# 模块 3：数据版本对比（季度快照的趋势与企业级差异）
+# =================================================================
+elif selected_module == "🗂️ 数据版本对比":
+    st.title("🗂️ 数据版本对比")
+    snaps = load_snapshot_store(SNAPSHOT_DIR)
+
+    with st.expander("➕ 将当前数据目录保存为新快照"):
+        s1, s2 = st.columns(2)
+        ref_date = s1.date_input("数据截止日期（企业年限按此计算）", key="snapshot_ref")
+        snap_id = s2.text_input("快照编号（留空按截止日期命名）", key="snapshot_id").strip()
+        if st.button("保存快照"):
+            try:
+                _, df_now, _ = data_store(DATA_DIR).snapshot()
+                if df_now is None:
+                    raise ValueError("数据目录中没有产业工作簿，无法保存快照。")
+                new_id = snaps.create(df_now, ref_date, snap_id or None, note="看板保存")
+                st.success(f"✅ 已保存快照 {new_id}")
+            except ValueError as e:
+                st.error(str(e))
+
+    catalog = snaps.catalog()
+    if catalog.empty:
+        st.info("💡 尚无快照。可在上方保存当前数据，或运行 `python snapshot_utils.py ingest <数据目录> --ref-date 2024-12-31` 导入历史版本。")
+        stop()
+    st.dataframe(catalog, hide_index=True)
+
+    st.subheader("1. 跨版本指标趋势")
+    trends = snaps.trends()
+    t1, t2 = st.columns([1, 2])
+    metric = t1.selectbox("指标", su.TREND_METRICS, key="trend_metric")
+    options = list(dict.fromkeys(trends['所属产业集群']))
+    picked = t2.multiselect("产业", options, default=[c for c in ["全市", *SPECIAL_5] if c in options], key="trend_clusters")
+    if picked:
+        show(vis.plot_snapshot_trend, trends, metric, picked, f"{metric} 跨版本趋势")
+
+    st.subheader("2. 版本间企业差异")
+    ids = snaps.ids()
+    if len(ids) < 2:
+        st.info("至少需要两个快照才能对比。")
+        stop()
+    v1, v2 = st.columns(2)
+    a = v1.selectbox("基准版本", ids, index=len(ids) - 2, key="diff_a")
+    b = v2.selectbox("对比版本", ids, index=len(ids) - 1, key="diff_b")
+    d = snaps.diff(a, b)
+    m1, m2, m3 = st.columns(3)
+    m1.metric("新增企业", len(d.added)); m2.metric("移除企业", len(d.removed)); m3.metric("指标变化企业", len(d.changed))
+    for tab, frame in zip(st.tabs(["🔺 变化", "🆕 新增", "🗑️ 移除"]), (d.changed, d.added, d.removed)):
+        with tab: st.dataframe(frame, hide_index=True)
+
+# =================================================================
+# 模块 4：企业评估报告库（Markdown / PDF，按需加载）
 # =================================================================
 elif selected_module == "📄 企业报告":
-    st.title("📄 案例企业")
-    
-    # 设定 Markdown 文件路径
-    # 假设你放在了根目录下的 docs 文件夹里
-    md_report_path = os.path.join(os.path.dirname(__file__), "report.md")
-
-    if os.path.exists(md_report_path):
-        with st.spinner("正在加载深度审计报告..."):
-            with open(md_report_path, "r", encoding="utf-8") as f:
-                report_content = f.read()
-            
-            # 使用 Streamlit 原生渲染 Markdown
-            # unsafe_allow_html=True 可以让你的 MD 支持一些 HTML 标签（如居中、颜色等）
-            st.markdown(report_content, unsafe_allow_html=True)
-            
-            st.divider()
-            st.success("✅ 审计报告已完成实时渲染。")
+    st.title("📄 企业评估报告")
+    # 报告页冷启动不读取产业数据：已在其他页面载入时顺带补全产业 / 区县，否则由用户按需载入
+    chain_loaded = DATA_DIR in loaded_stores()
+    if not chain_loaded and st.button("🔗 补全企业所属产业 / 区县（载入产业数据）", key="report_link_chain"):
+        chain_loaded = True
+    DATA_VERSION = data_version(DATA_DIR) if chain_loaded else None
+    lib = load_report_library(REPORT_SOURCES, report_signature(REPORT_SOURCES), DATA_VERSION)
+    if not len(lib):
+        st.error("❌ 未找到报告文件。请将 Markdown / PDF 报告放入 `reports/` 目录或根目录的 `report.md`。")
+        stop()
+
+    q = st.text_input("🔎 全文检索（报告正文任意片段）", key="report_query")
+    ids = lib.index['id'].tolist()
+    if q:
+        hits = lib.search(q)
+        st.caption(f"命中 {len(hits)} 页")
+        st.dataframe(hits, hide_index=True)
+        ids = list(dict.fromkeys(hits['id'])) or ids
+    with st.expander(f"📚 报告目录（共 {len(lib)} 份）"):
+        st.dataframe(lib.index.drop(columns='路径'), hide_index=True)
+
+    meta = lib.index.set_index('id')
+    rid = st.selectbox("查看报告：", ids, key="report_id",
+                       format_func=lambda r: f"{meta.at[r, '企业']} · {meta.at[r, '类型']} · {meta.at[r, '日期']}")
+    row = meta.loc[rid]
+    st.caption(" · ".join(str(v) for v in (row['企业'], row['产业'], row['区县'], row['日期']) if v))
+
+    pages = None
+    if row['类型'] == 'PDF' and pd.notna(row['页数']) and row['页数'] > 1:
+        n = int(row['页数'])
+        pages = st.slider("页码区间", 1, n, (1, min(n, 10)), key=f"report_pages_{rid}")
+    doc = lib.render(rid, pages)
+    if doc.kind == "md":
+        # unsafe_allow_html=True 可以让你的 MD 支持一些 HTML 标签（如居中、颜色等）
+        st.markdown(doc.body, unsafe_allow_html=True)
     else:
-        st.error(f"❌ 未找到报告文件。请检查路径：`{md_report_path}`")
-        st.info("💡 提示：请确保已将 report.md 上传至 GitHub 仓库。")
-
-
-
+        pdf_view(doc.body)
+        st.download_button("⬇️ 下载所选页", doc.body, f"{os.path.splitext(os.path.basename(rid))[0]}_{doc.pages or 'all'}.pdf",
+                           "application/pdf")
+        if doc.texts:
+            with st.expander("📝 所选页文本"):
+                for k, text in enumerate(doc.texts, start=doc.pages[0]):
+                    st.markdown(f"**第 {k} 页**")
+                    st.text(text)
+    st.divider()
+    st.success("✅ 审计报告已完成实时渲染。")
 
+# --- 性能调试面板（放在脚本末尾，以便汇总本次重跑的全部 span；提前结束的重跑经 stop() 同样渲染） ---
+debug_panel()
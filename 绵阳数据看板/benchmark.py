@@ -0,0 +1,360 @@
+"""看板基准测试与压力测试。
+
+用法：
+    python benchmark.py suite --scales 1 10 100 --out bench_results.json   # 全链路基准（合成数据）
+    python benchmark.py suite --compare old.json                           # 与历史结果对比
+    python benchmark.py clean --sizes 10000 100000 1000000                 # 清洗引擎一致性校验与耗时对比
+    python benchmark.py soak --reruns 2000                                 # 图像生命周期压力测试
+    python benchmark.py startup --repeat 3                                 # 冷启动首屏耗时
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import data_utils as du
+from data_utils import RISK_COLS, clean_pct, process_chain_data
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+
+DISTRICTS = ['涪城区', '游仙区', '安州区', '江油市', '三台县', '盐亭县', '梓潼县', '北川羌族自治县', '平武县']
+SCALES = ['大型', '中型', '小型', '微型']
+
+# --- 1. 合成数据 ---
+def make_synthetic_chain(n, seed=0, names=None):
+    """按真实工作簿口径生成 n 行原始数据（含缺失值、'NA'、百分比字符串与风险列）。
+
+    names 为可选的公司名称池，从中无放回抽取，以模拟同一企业出现在多个产业中。
+    """
+    rng = np.random.default_rng(seed)
+    if names is None:
+        names = np.char.add('合成企业', np.arange(n).astype(str))
+    else:
+        names = rng.choice(names, n, replace=False)
+
+    def pct_col():
+        vals = rng.uniform(0, 100, n)
+        out = np.char.add(np.round(vals, 2).astype(str), '%').astype(object)
+        out[rng.random(n) < 0.4] = np.nan
+        out[rng.random(n) < 0.02] = 'NA'
+        frac = rng.random(n) < 0.05
+        out[frac] = vals[frac] / 100  # 少量以小数形式录入
+        return out
+
+    dates = pd.to_datetime('1990-01-01') + pd.to_timedelta(rng.integers(0, 12500, n), unit='D')
+    loc = np.char.add('四川省,绵阳市,', rng.choice(DISTRICTS, n)).astype(object)
+    loc[rng.random(n) < 0.01] = np.nan
+    df = pd.DataFrame({
+        '公司名称': names,
+        '专利数量': np.where(rng.random(n) < 0.5, np.nan, rng.integers(0, 200, n)),
+        '业务支撑指数': pct_col(),
+        '技术护城河深度': np.where(rng.random(n) < 0.4, np.nan, rng.uniform(0, 100, n).round(2)),
+        '产品技术覆盖率': pct_col(),
+        '公司所在地': loc,
+        '企业资质总量': rng.integers(0, 30, n),
+        '注册资本': rng.integers(1, 500, n) * 100000,
+        '成立日期': np.where(rng.random(n) < 0.01, pd.NaT, dates),
+        '融资次数': np.where(rng.random(n) < 0.9, np.nan, rng.integers(1, 5, n)),
+        '企业划型名称': rng.choice(SCALES, n, p=[0.05, 0.1, 0.25, 0.6]),
+    })
+    for col in RISK_COLS:
+        df[col] = np.where(rng.random(n) < 0.03, '是', '否')
+    return df
+
+def real_row_counts(data_dir=DATA_DIR):
+    """真实工作簿的行数（openpyxl 只读模式仅读取表头维度信息）"""
+    from openpyxl import load_workbook
+    counts = {}
+    for f in du.list_chain_files(data_dir):
+        wb = load_workbook(os.path.join(data_dir, f), read_only=True)
+        counts[f.replace(".xlsx", "")] = max(wb.active.max_row - 1, 1)
+        wb.close()
+    return counts
+
+def synthetic_chains(scale, base_counts, seed=0):
+    """按真实产业名称与 scale 倍行数逐个生成 (产业名称, 原始数据)；约 15% 的企业跨产业重复出现"""
+    sizes = {name: n * scale for name, n in base_counts.items()}
+    pool = np.char.add('合成企业', np.arange(int(sum(sizes.values()) * 0.85) + 1).astype(str))
+    for i, (name, n) in enumerate(sizes.items()):
+        yield name, make_synthetic_chain(n, seed + i, names=pool)
+
+def write_synthetic_workbooks(out_dir, scale, base_counts, seed=0):
+    """写出合成工作簿，返回总行数"""
+    rows = 0
+    for name, raw in synthetic_chains(scale, base_counts, seed):
+        raw.to_excel(os.path.join(out_dir, f"{name}.xlsx"), index=False)
+        rows += len(raw)
+    return rows
+
+def synthetic_frames(scale, base_counts, seed=0):
+    """与合成工作簿同口径的 (df_all, df_mets)，直接在内存中清洗，不写出、不解析 xlsx"""
+    parts, mets = [], []
+    for name, raw in synthetic_chains(scale, base_counts, seed):
+        df = process_chain_data(raw)
+        mets.append({"产业名称": name, **du.chain_metrics(df), "分类": "其他产业"})
+        parts.append(df.assign(所属产业集群=name))
+    return pd.concat(parts, ignore_index=True), pd.DataFrame(mets)
+
+# --- 2. 原逐行实现（对照基线） ---
+def process_chain_data_rowwise(df):
+    """向量化改写前的逐行清洗实现，仅用于一致性校验与耗时对比"""
+    df.columns = df.columns.str.strip()
+    df['注册资本_f'] = pd.to_numeric(df.get('注册资本', 0), errors='coerce').fillna(0) / 10000
+    df['专利数量_f'] = pd.to_numeric(df.get('专利数量', 0), errors='coerce').fillna(0)
+    df['资质总量_f'] = pd.to_numeric(df.get('企业资质总量', 0), errors='coerce').fillna(0)
+    if '成立日期' in df.columns:
+        df['成立日期'] = pd.to_datetime(df['成立日期'], errors='coerce')
+        df['企业年限'] = df['成立日期'].apply(lambda x: 2024 - x.year if pd.notnull(x) else np.nan)
+    if '公司所在地' in df.columns:
+        df['区县'] = df['公司所在地'].apply(lambda x: str(x).split(',')[-1].strip() if pd.notnull(x) else "未知")
+    df['支撑得分'] = df.get('业务支撑指数', pd.Series(dtype=float)).apply(clean_pct)
+    df['覆盖得分'] = df.get('产品技术覆盖率', pd.Series(dtype=float)).apply(clean_pct)
+    df['护城河得分'] = pd.to_numeric(df.get('技术护城河深度', np.nan), errors='coerce')
+    df['是否融资'] = (pd.to_numeric(df.get('融资次数', 0), errors='coerce').fillna(0) > 0).map({True: '获投企业', False: '未获投'})
+
+    def age_group(age):
+        if pd.isna(age): return '未知'
+        return '青年企业(≤5年)' if age <= 5 else '中坚企业(6-15年)' if age <= 15 else '老牌企业(>15年)'
+    df['年限梯队'] = df['企业年限'].apply(age_group)
+    return df
+
+def check_parity(raw):
+    """两种实现的输出列、取值与缺失值位置必须完全一致"""
+    new = process_chain_data(raw.copy())
+    old = process_chain_data_rowwise(raw.copy())
+    assert list(new.columns) == list(old.columns)
+    for col in new.columns:
+        a, b = new[col], old[col]
+        if pd.api.types.is_numeric_dtype(a) and pd.api.types.is_numeric_dtype(b):
+            np.testing.assert_array_equal(a.to_numpy(float), b.to_numpy(float), err_msg=col)
+        else:
+            assert (a.isna() == b.isna()).all(), col
+            assert (a.astype(object)[a.notna()] == b.astype(object)[b.notna()]).all(), col
+
+def _timeit(func, raw, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        df = raw.copy()
+        t0 = time.perf_counter()
+        func(df)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def bench_cleaning(sizes, repeat=3):
+    """逐个规模校验一致性并记录两种实现的最佳耗时"""
+    print(f"{'行数':>10} {'逐行(s)':>10} {'向量化(s)':>10} {'加速比':>8}")
+    for n in sizes:
+        raw = make_synthetic_chain(n)
+        check_parity(raw)
+        t_old = _timeit(process_chain_data_rowwise, raw, repeat)
+        t_new = _timeit(process_chain_data, raw, repeat)
+        print(f"{n:>10} {t_old:>10.3f} {t_new:>10.3f} {t_old / t_new:>7.1f}x")
+
+# --- 3. 图像生命周期压力测试 ---
+def _rss_mb():
+    # 当前常驻内存；非 Linux 平台退回进程峰值
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def soak_figures(reruns, rows=300, report_every=200):
+    """模拟大量重复渲染（绕过图像缓存），检查 pyplot 注册表与常驻内存是否保持平稳"""
+    import warnings
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import visual_utils as vis
+
+    warnings.simplefilter("ignore")  # 字体缺失等告警不影响内存观测
+    df = process_chain_data(make_synthetic_chain(rows))
+    charts = [(vis.plot_scale_pie, (df, "规模")), (vis.plot_region_bar, (df, "区县")), (vis.plot_risk_barh, (df,))]
+    baseline = None
+    print(f"{'重绘次数':>8} {'打开图像':>8} {'RSS(MB)':>9}")
+    for i in range(1, reruns + 1):
+        func, args = charts[i % len(charts)]
+        with vis.managed_figures():
+            vis.figure_bytes(func(*args), dpi=50)
+        if i % report_every == 0 or i == reruns:
+            rss = _rss_mb()
+            baseline = baseline or rss
+            print(f"{i:>8} {len(plt.get_fignums()):>8} {rss:>9.1f}")
+    assert not plt.get_fignums(), "存在未释放的图像"
+    print(f"RSS 增量（首次采样后）：{_rss_mb() - baseline:.1f} MB")
+
+# --- 4. 全链路基准套件 ---
+def _best_of(func, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def _synthetic_trends(df_all):
+    """两期快照的趋势长表（口径同 SnapshotStore.trends()）：第二期为第一期各指标上浮 5%"""
+    import snapshot_utils as su
+    first = su.snapshot_summary(df_all.assign(**{du.RISK_MASK_COL: du.pack_risk_flags(df_all)}))
+    second = first.assign(**{c: first[c].astype(float) * 1.05 for c in su.TREND_METRICS})
+    cols = ['快照', '参考日期', '所属产业集群', *su.TREND_METRICS]
+    return pd.concat([first.assign(快照='v1', 参考日期='2023-12-31')[cols],
+                      second.assign(快照='v2', 参考日期='2024-12-31')[cols]], ignore_index=True)
+
+def _plot_cases(vis, df_all, df_mets):
+    """每个 plot_* 函数一个用例，入参口径与看板一致（需预先计算的入参在用例外准备，不计入耗时）"""
+    import index_utils as iu
+    first = df_all['所属产业集群'].iloc[0]
+    df_c = df_all[df_all['所属产业集群'] == first]
+    df_p = df_c[df_c['专利数量_f'] > 0]
+    overlap = iu.ClusterOverlap(df_all)
+    trends = _synthetic_trends(df_all)
+    picked = ['全市', *df_mets['产业名称'][:5]]
+    return {
+        'plot_mianyang_ranking': lambda: vis.plot_mianyang_ranking(df_mets, "企业数量", "规模"),
+        'plot_special_geo_stacked': lambda: vis.plot_special_geo_stacked(df_all, list(df_mets['产业名称'][:5])),
+        'plot_scale_pie': lambda: vis.plot_scale_pie(df_c, "规模"),
+        'plot_age_dist': lambda: vis.plot_age_dist(df_c, "年限"),
+        'plot_capital_dist': lambda: vis.plot_capital_dist(df_c),
+        'plot_overlap_heatmap': lambda: vis.plot_overlap_heatmap(overlap.counts, "产业交叉重叠（共有企业数）"),
+        'plot_region_bar': lambda: vis.plot_region_bar(df_c, "区县"),
+        'plot_risk_barh': lambda: vis.plot_risk_barh(df_c),
+        'plot_qual_dist': lambda: vis.plot_qual_dist(df_c),
+        'plot_metric_trend': lambda: vis.plot_metric_trend(df_p, '支撑得分', '业务支撑指数'),
+        'plot_metric_violin': lambda: vis.plot_metric_violin(df_p, '支撑得分', '业务支撑指数'),
+        'plot_bubble_chart': lambda: vis.plot_bubble_chart(df_p),
+        'plot_funding_box': lambda: vis.plot_funding_box(df_p, '支撑得分', '业务支撑指数'),
+        'plot_age_matrix_row': lambda: vis.plot_age_matrix_row(df_p, '支撑得分', '业务支撑指数'),
+        'plot_time_trend_sd': lambda: vis.plot_time_trend_sd(df_p, '支撑得分', '业务支撑指数', 'royalblue'),
+        'plot_snapshot_trend': lambda: vis.plot_snapshot_trend(trends, '企业数量', picked, "企业数量 跨版本趋势"),
+    }
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(scales, repeat=1, skip_load=False):
+    """按 scale 倍真实行数生成合成工作簿，分别计时读取、清洗与每个绘图函数（含 PNG 序列化）"""
+    import warnings
+    import matplotlib
+    matplotlib.use("Agg")
+    import visual_utils as vis
+
+    warnings.simplefilter("ignore")
+    base = real_row_counts() if os.path.isdir(DATA_DIR) else {f"产业{i}": 300 for i in range(16)}
+    results = []
+
+    def record(scale, rows, target, seconds):
+        results.append({"scale": scale, "rows": rows, "target": target, "seconds": round(seconds, 6)})
+        print(f"{scale:>5}x {rows:>9} {target:<28} {seconds:>9.3f}s")
+
+    for scale in scales:
+        if skip_load:
+            df_all, df_mets = synthetic_frames(scale, base)
+            rows = len(df_all)
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                rows = write_synthetic_workbooks(tmp, scale, base)
+                record(scale, rows, "load_all_data[serial]", _best_of(lambda: du.load_all_data(tmp, workers=1), repeat))
+                record(scale, rows, "load_all_data[parallel]", _best_of(lambda: du.load_all_data(tmp), repeat))
+                df_all, df_mets = du.load_all_data(tmp)
+        raw = pd.concat([make_synthetic_chain(n * scale, i) for i, n in enumerate(base.values())], ignore_index=True)
+        record(scale, rows, "process_chain_data", _best_of(lambda: process_chain_data(raw.copy()), repeat))
+        for name, make in _plot_cases(vis, df_all, df_mets).items():
+            record(scale, rows, name, _best_of(lambda: vis.figure_bytes(make(), dpi=100), repeat))
+    return results
+
+def save_results(results, path):
+    meta = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": _git_commit(),
+            "python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+            "cpu_count": os.cpu_count()}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, ensure_ascii=False, indent=1)
+    print(f"结果已写入 {path}")
+
+def compare_results(results, old_path, threshold=1.2):
+    """与历史结果逐项对比，耗时增长超过 threshold 倍的项标记为回归"""
+    with open(old_path, encoding="utf-8") as f:
+        old = {(r["scale"], r["target"]): r["seconds"] for r in json.load(f)["results"]}
+    regressions = 0
+    for r in results:
+        prev = old.get((r["scale"], r["target"]))
+        if prev:
+            ratio = r["seconds"] / prev
+            flag = "⚠️ 回归" if ratio > threshold else ""
+            regressions += bool(flag)
+            print(f"{r['scale']:>5}x {r['target']:<28} {prev:>9.3f}s → {r['seconds']:>9.3f}s ({ratio:.2f}x) {flag}")
+    return regressions
+
+# --- 5. 冷启动首屏耗时 ---
+# 每个场景在全新解释器中执行，模拟服务重启后用户打开的第一个页面
+_STARTUP_PROBE = """
+import sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=600)
+at.session_state["module"] = sys.argv[2]
+at.session_state["lazy_render"] = sys.argv[3] == "1"
+t1 = time.perf_counter()
+at.run()
+assert not at.exception, at.exception
+print(t1 - t0, time.perf_counter() - t1, int("matplotlib" in sys.modules))
+"""
+
+STARTUP_CASES = [("📄 企业报告", True), ("📍 绵阳企业产业分布一览", True),
+                 ("🤖 产业链深度解析", True), ("🤖 产业链深度解析", False)]
+
+def bench_startup(repeat=3):
+    """各页面冷启动首屏耗时（取最优）；import 列为 visual_utils 导入耗时"""
+    app = os.path.join(BASE_DIR, "app.py")
+    out = subprocess.run([sys.executable, "-c", "import time; t = time.perf_counter(); import visual_utils; "
+                          "print(time.perf_counter() - t)"], cwd=BASE_DIR, capture_output=True, text=True, check=True)
+    print(f"import visual_utils: {float(out.stdout.split()[-1]):.3f}s")
+    print(f"{'页面':<16}{'按需':>6}{'首屏':>10}{'matplotlib':>12}")
+    for module, lazy in STARTUP_CASES:
+        best, mpl = np.inf, None
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, "-c", _STARTUP_PROBE, app, module, str(int(lazy))],
+                                 cwd=BASE_DIR, capture_output=True, text=True, check=True)
+            _, run_s, mpl = out.stdout.split()[-3:]
+            best = min(best, float(run_s))
+        print(f"{module:<14}{'是' if lazy else '否':>6}{best:>9.2f}s{'已加载' if mpl == '1' else '未加载':>10}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="看板基准测试与压力测试")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_suite = sub.add_parser("suite", help="全链路基准：读取 / 清洗 / 每个绘图函数")
+    p_suite.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    p_suite.add_argument("--repeat", type=int, default=1)
+    p_suite.add_argument("--skip-load", action="store_true", help="不写出、不解析合成 xlsx，也不计时读取，直接在内存中清洗（大倍数下写 xlsx 较慢）")
+    p_suite.add_argument("--out", default="bench_results.json")
+    p_suite.add_argument("--compare", help="历史结果 JSON，用于回归对比")
+    p_clean = sub.add_parser("clean", help="清洗引擎一致性校验与耗时对比")
+    p_clean.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    p_clean.add_argument("--repeat", type=int, default=3)
+    p_soak = sub.add_parser("soak", help="图像生命周期压力测试")
+    p_soak.add_argument("--reruns", type=int, default=2000)
+    p_startup = sub.add_parser("startup", help="冷启动首屏耗时（按页面、按需渲染开关）")
+    p_startup.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    if args.cmd == "suite":
+        res = run_suite(args.scales, args.repeat, args.skip_load)
+        save_results(res, args.out)
+        if args.compare and compare_results(res, args.compare):
+            raise SystemExit(1)
+    elif args.cmd == "clean":
+        bench_cleaning(args.sizes, args.repeat)
+    elif args.cmd == "startup":
+        bench_startup(args.repeat)
+    else:
+        soak_figures(args.reruns)
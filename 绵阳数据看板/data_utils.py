@@ -1,5 +1,33 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import multiprocessing
+from collections import OrderedDict, namedtuple
+from statistics import NormalDist
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import pandas as pd
 import numpy as np
+from trace_utils import span, traced
+
+try:
+    import pyarrow  # noqa: F401  列式缓存依赖 (Parquet)
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+RISK_COLS = ['经营异常', '严重违法', '行政处罚', '被执行人', '失信被执行人', '对外担保', '股权出质']
+RISK_MASK_COL = '风险标记'  # 紧凑模式下七项风险的 uint8 位图，第 i 位对应 RISK_COLS[i]
+CATEGORY_COLS = ['区县', '企业划型名称', '所属产业集群', '年限梯队', '是否融资']
+FLOAT32_COLS = ['支撑得分', '覆盖得分', '护城河得分', '注册资本_f', '专利数量_f', '资质总量_f', '企业年限']
+CUBE_DIMS = ['所属产业集群', '区县', '企业划型名称', '年限梯队', '是否融资', '有专利']
+CUBE_MEASURES = ['支撑得分', '覆盖得分', '护城河得分', '注册资本_f', '专利数量_f', '资质总量_f', '企业年限']
+
+# 清洗逻辑变更时递增，使旧缓存整体失效
+CACHE_VERSION = 2
+MANIFEST_NAME = "manifest.json"
 
 def clean_pct(x):
     """处理百分比字符串与数值的统一转换"""
@@ -10,8 +38,48 @@ def clean_pct(x):
         return val if val > 1 else val * 100
     except: return np.nan
 
-def process_chain_data(df):
-    """严格映射审计所需的清洗字段"""
+def _map_uniques(s, func, fill):
+    """低基数列先去重再计算，结果按编码映射回原行；缺失值取 fill"""
+    codes, uniques = pd.factorize(s)
+    out = np.asarray(func(pd.Series(uniques, dtype=object)), dtype=object if isinstance(fill, str) else float)
+    return pd.Series(np.append(out, fill)[codes], index=s.index)
+
+def _parse_pct(u):
+    # 数值单元格直接取值，其余按字符串去掉 % 后解析
+    val = pd.to_numeric(u, errors='coerce').astype(float)
+    rest = val.isna()
+    if rest.any():
+        val[rest] = pd.to_numeric(u[rest].astype(str).str.replace('%', '', regex=False).str.strip(), errors='coerce')
+    return val
+
+def clean_pct_series(s):
+    """clean_pct 的向量化版本：百分比字符串 / 小数统一为 0-100 分值"""
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        val = s.astype(float)
+    else:
+        val = _map_uniques(s, _parse_pct, np.nan)
+    return val.where(val > 1, val * 100)
+
+# 企业年限的默认参考年份（原始看板按 2024 年数据撰写）；数据快照按各自的截止日期计算
+REF_YEAR = 2024
+AGE_TIERS = ['青年企业(≤5年)', '中坚企业(6-15年)', '老牌企业(>15年)']
+
+def ref_year(ref_date):
+    """参考日期 → 年份：接受年份整数或任意可解析的日期"""
+    return int(ref_date) if isinstance(ref_date, (int, np.integer)) else pd.Timestamp(ref_date).year
+
+def age_tier(age):
+    return np.select([age <= 5, age <= 15, age > 15], AGE_TIERS, default='未知')
+
+def add_age_columns(df, ref_date=REF_YEAR):
+    """按参考日期（重新）计算 企业年限 与 年限梯队"""
+    df['企业年限'] = (ref_year(ref_date) - df['成立日期'].dt.year).astype(float)
+    df['年限梯队'] = age_tier(df['企业年限'])
+    return df
+
+@traced()
+def process_chain_data(df, ref_date=REF_YEAR):
+    """严格映射审计所需的清洗字段；企业年限按 ref_date（年份或日期）计算"""
     df.columns = df.columns.str.strip()
     df['注册资本_f'] = pd.to_numeric(df.get('注册资本', 0), errors='coerce').fillna(0) / 10000 
     df['专利数量_f'] = pd.to_numeric(df.get('专利数量', 0), errors='coerce').fillna(0)
@@ -19,20 +87,605 @@ def process_chain_data(df):
     
     if '成立日期' in df.columns:
         df['成立日期'] = pd.to_datetime(df['成立日期'], errors='coerce')
-        df['企业年限'] = df['成立日期'].apply(lambda x: 2024 - x.year if pd.notnull(x) else np.nan)
+        df['企业年限'] = (ref_year(ref_date) - df['成立日期'].dt.year).astype(float)
     
     if '公司所在地' in df.columns:
-        df['区县'] = df['公司所在地'].apply(lambda x: str(x).split(',')[-1].strip() if pd.notnull(x) else "未知")
+        df['区县'] = _map_uniques(df['公司所在地'], lambda u: u.astype(str).str.rsplit(',', n=1).str[-1].str.strip(), "未知")
 
     # 审计核心三指标
-    df['支撑得分'] = df.get('业务支撑指数', pd.Series(dtype=float)).apply(clean_pct)
-    df['覆盖得分'] = df.get('产品技术覆盖率', pd.Series(dtype=float)).apply(clean_pct)
+    df['支撑得分'] = clean_pct_series(df.get('业务支撑指数', pd.Series(dtype=float)))
+    df['覆盖得分'] = clean_pct_series(df.get('产品技术覆盖率', pd.Series(dtype=float)))
     df['护城河得分'] = pd.to_numeric(df.get('技术护城河深度', np.nan), errors='coerce')
 
     df['是否融资'] = (pd.to_numeric(df.get('融资次数', 0), errors='coerce').fillna(0) > 0).map({True: '获投企业', False: '未获投'})
     
-    def age_group(age):
-        if pd.isna(age): return '未知'
-        return '青年企业(≤5年)' if age <= 5 else '中坚企业(6-15年)' if age <= 15 else '老牌企业(>15年)'
-    df['年限梯队'] = df['企业年限'].apply(age_group)
-    return df
\ No newline at end of file
+    df['年限梯队'] = age_tier(df['企业年限'])
+    return df
+
+def frame_fingerprint(obj):
+    """数据内容指纹：DataFrame/Series 按逐行哈希 + 列名 + 类型计算，ndarray 按类型 + 形状 + 原始字节，
+    tuple/list/dict 逐元素递归，其余对象取 repr（numpy 的 repr 会截断长数组，不能用作内容指纹）"""
+    h = hashlib.sha1()
+    _feed_fingerprint(h, obj)
+    return h.hexdigest()
+
+def _feed_fingerprint(h, obj):
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        frame = obj.to_frame() if isinstance(obj, pd.Series) else obj
+        h.update(repr((type(obj).__name__, frame.shape, list(frame.columns), list(map(str, frame.dtypes)))).encode())
+        try:
+            h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+        except TypeError:  # 含列表等不可哈希单元格
+            h.update(obj.to_json(force_ascii=False, default_handler=str).encode())
+    elif isinstance(obj, np.ndarray):
+        h.update(repr(("ndarray", obj.dtype.str, obj.shape)).encode())
+        if obj.dtype.hasobject:  # 对象数组的字节是指针，逐元素处理
+            for item in obj.ravel().tolist():
+                _feed_fingerprint(h, item)
+        else:
+            h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, (tuple, list, dict)):
+        items = [x for kv in obj.items() for x in kv] if isinstance(obj, dict) else obj
+        h.update(f"{type(obj).__name__}[{len(obj)}](".encode())
+        for item in items:
+            _feed_fingerprint(h, item)
+        h.update(b")")
+    else:
+        h.update(repr(obj).encode() + b"\0")
+
+# --- 紧凑内存布局 ---
+def risk_matrix(df):
+    """n × 7 布尔风险矩阵，兼容紧凑位图列与原始 是/否 字符串列"""
+    if RISK_MASK_COL in df.columns:
+        bits = df[RISK_MASK_COL].to_numpy(np.uint8)
+        return ((bits[:, None] >> np.arange(len(RISK_COLS), dtype=np.uint8)) & 1).astype(bool)
+    return np.column_stack([(df[c] == '是').to_numpy(bool) if c in df.columns else np.zeros(len(df), bool)
+                            for c in RISK_COLS])
+
+def pack_risk_flags(df):
+    """七项风险 是/否 列压缩为一个 uint8 位图"""
+    weights = (1 << np.arange(len(RISK_COLS))).astype(np.uint8)
+    return (risk_matrix(df).astype(np.uint8) * weights).sum(axis=1).astype(np.uint8)
+
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 2**20
+
+def compact_frame(df, label="df_all"):
+    """紧凑模式：低基数文本列转 category、得分列转 float32、风险列打包为位图，并打印前后内存"""
+    before = memory_mb(df)
+    out = df.drop(columns=[c for c in RISK_COLS if c in df.columns])
+    out[RISK_MASK_COL] = pack_risk_flags(df)
+    for c in CATEGORY_COLS:
+        if c in out.columns: out[c] = out[c].astype('category')
+    for c in FLOAT32_COLS:
+        if c in out.columns: out[c] = out[c].astype(np.float32)
+    print(f"ℹ️ {label} 内存：{before:.1f} MB → {memory_mb(out):.1f} MB（紧凑模式）")
+    return out
+
+# --- 回归与置信带 ---
+RegressionFit = namedtuple('RegressionFit', 'slope intercept r n x y lo hi')
+_FIT_CACHE, _FIT_CACHE_SIZE = OrderedDict(), 256
+_FIT_LOCK = threading.Lock()  # render_many 的渲染线程会并发调用 linear_fit
+
+def _t_quantile(p, dof):
+    """Student t 分位数：优先 scipy.special.stdtrit（首次调用时导入，比 scipy.stats 轻）。
+
+    未安装 scipy 时用 Cornish-Fisher 展开，其误差仅在 dof≥3 时 <1%；更小自由度返回 None（不画置信带）。
+    """
+    try:
+        from scipy.special import stdtrit
+        return float(stdtrit(dof, p))
+    except ImportError:
+        if dof < 3:
+            return None
+    z = NormalDist().inv_cdf(p)
+    return (z + (z**3 + z) / (4 * dof) + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * dof**2)
+            + (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384 * dof**3))
+
+def linear_fit(df, x, y, ci=95, grid=100):
+    """闭式 OLS 拟合 + 回归均值的解析置信带 + Pearson R；按 (数据指纹, x, y) 缓存。
+
+    有效样本不足 3 个或 x 无变化时返回 None；无法求得 t 分位数时 lo / hi 为 None。
+    """
+    key = (frame_fingerprint(df[[x, y]]), x, y, ci, grid)
+    with _FIT_LOCK:
+        if key in _FIT_CACHE:
+            _FIT_CACHE.move_to_end(key)
+            return _FIT_CACHE[key]
+    d = df[[x, y]].dropna().to_numpy(float)
+    fit = None
+    if len(d) >= 3:
+        xs, ys = d[:, 0], d[:, 1]
+        n, xm, ym = len(d), xs.mean(), ys.mean()
+        sxx, syy, sxy = ((xs - xm)**2).sum(), ((ys - ym)**2).sum(), ((xs - xm) * (ys - ym)).sum()
+        if sxx > 0:
+            slope = sxy / sxx
+            intercept = ym - slope * xm
+            r = sxy / np.sqrt(sxx * syy) if syy > 0 else 0.0
+            s = np.sqrt(max(syy - slope * sxy, 0) / (n - 2))
+            gx = np.linspace(xs.min(), xs.max(), grid)
+            gy = intercept + slope * gx
+            tq = _t_quantile(0.5 + ci / 200, n - 2)
+            half = None if tq is None else tq * s * np.sqrt(1 / n + (gx - xm)**2 / sxx)
+            fit = RegressionFit(slope, intercept, r, n, gx, gy, *((None, None) if half is None else (gy - half, gy + half)))
+    with _FIT_LOCK:
+        _FIT_CACHE[key] = fit
+        while len(_FIT_CACHE) > _FIT_CACHE_SIZE:
+            _FIT_CACHE.popitem(last=False)
+    return fit
+
+# --- 多维聚合立方体 ---
+class AggregateCube:
+    """加载时一次性构建的聚合立方体。
+
+    维度为 CUBE_DIMS（有专利 = 专利数量_f > 0），每格保存行数、各指标的非空计数 /
+    和 / 平方和以及各风险项命中数。图表与筛选只需在格子上再聚合，
+    耗时与格子数相关而与企业行数无关。
+    """
+
+    def __init__(self, df, dims=CUBE_DIMS, measures=CUBE_MEASURES):
+        work = {'有专利': df['专利数量_f'] > 0} if '有专利' in dims else {}
+        work.update({d: df[d] for d in dims if d != '有专利'})
+        work['行数'] = np.ones(len(df), dtype=np.int64)
+        self.measures = [m for m in measures if m in df.columns]
+        for m in self.measures:
+            # 紧凑模式下得分列为 float32：先升为 float64，和与平方和按 float64 累加，避免 std 相消时丢失精度
+            vals = pd.to_numeric(df[m], errors='coerce').astype(np.float64)
+            work[m + '_n'] = vals.notna().astype(np.int64)
+            work[m + '_sum'] = vals.fillna(0)
+            work[m + '_sq'] = vals.fillna(0) ** 2
+        self.risks = list(RISK_COLS)
+        for c, flags in zip(self.risks, risk_matrix(df).T):
+            work[c] = flags.astype(np.int64)
+        self.dims = list(dims)
+        self.cells = (pd.DataFrame(work).groupby(self.dims, observed=True, dropna=False, sort=False)
+                      .sum().reset_index())
+
+    def slice(self, **filters):
+        """按维度取值过滤格子；取值可为单值或列表"""
+        mask = np.ones(len(self.cells), dtype=bool)
+        for dim, val in filters.items():
+            col = self.cells[dim]
+            mask &= col.isin(val).to_numpy() if isinstance(val, (list, tuple, set)) else (col == val).to_numpy()
+        return self.cells[mask]
+
+    def counts(self, by, **filters):
+        """行数汇总；by 为单个维度时按数量降序（与 value_counts 口径一致）"""
+        out = self.slice(**filters).groupby(by, observed=True)['行数'].sum()
+        return out.sort_values(ascending=False) if isinstance(by, str) else out
+
+    def mean(self, measure, by, **filters):
+        g = self.slice(**filters).groupby(by, observed=True)
+        return g[measure + '_sum'].sum() / g[measure + '_n'].sum().replace(0, np.nan)
+
+    def std(self, measure, by, **filters):
+        """样本标准差（ddof=1），由和与平方和还原"""
+        g = self.slice(**filters).groupby(by, observed=True)
+        n, s, sq = (g[measure + k].sum() for k in ('_n', '_sum', '_sq'))
+        return np.sqrt(((sq - s**2 / n) / (n - 1)).clip(lower=0)).where(n > 1)
+
+    def risk_counts(self, **filters):
+        return self.slice(**filters)[self.risks].sum()
+
+# --- 分布摘要（直方图 + 分箱 FFT 核密度） ---
+SCORE_COLS = ['支撑得分', '护城河得分', '覆盖得分']
+HistKDE = namedtuple('HistKDE', 'edges counts grid curve n mean')        # curve 已按频数缩放，可与直方图叠画
+ViolinStats = namedtuple('ViolinStats', 'grid density q1 median q3 lo hi n')  # lo / hi 为 1.5 IQR 须线端点
+TrendBand = namedtuple('TrendBand', 'x mean sd')
+DistSummary = namedtuple('DistSummary', 'age qual age_rows violins trends')
+_KDE_BINS = 1024
+
+def _finite(values):
+    x = np.asarray(pd.to_numeric(pd.Series(values), errors='coerce'), dtype=float)
+    return x[np.isfinite(x)]
+
+def fft_kde(x, lo, hi, grid=256, bw_adjust=1.0):
+    """高斯核密度：样本先分到 1024 个细箱，再与离散化的核做 FFT 卷积，代价与样本量无关。
+
+    带宽取 Scott 规则（与 scipy.stats.gaussian_kde 默认一致），返回 [lo, hi] 上 grid 个点的概率密度；
+    样本不足两个或方差为 0 时返回 (None, None)。
+    """
+    n = len(x)
+    if n < 2 or np.std(x) == 0:
+        return None, None
+    bw = bw_adjust * np.std(x, ddof=1) * n ** (-1 / 5)
+    counts, edges = np.histogram(x, bins=_KDE_BINS, range=(lo - 3 * bw, hi + 3 * bw))  # 外延 3 倍带宽，避免截断核质量
+    centers, dx = (edges[:-1] + edges[1:]) / 2, edges[1] - edges[0]
+    offsets = np.arange(-_KDE_BINS + 1, _KDE_BINS) * dx
+    kernel = np.exp(-0.5 * (offsets / bw) ** 2) / (bw * np.sqrt(2 * np.pi))
+    size = 1 << int(np.ceil(np.log2(3 * _KDE_BINS)))
+    conv = np.fft.irfft(np.fft.rfft(counts, size) * np.fft.rfft(kernel, size), size)[_KDE_BINS - 1:2 * _KDE_BINS - 1]
+    gx = np.linspace(lo, hi, grid)
+    return gx, np.interp(gx, centers, np.clip(conv, 0, None) / n)
+
+def hist_kde(values, bins=15):
+    """直方图频数 + 按频数缩放的核密度曲线（对应 sns.histplot(kde=True)，曲线不外延出数据范围）"""
+    x = _finite(values)
+    if not len(x):
+        return HistKDE(np.array([0.0, 1.0]), np.zeros(1), None, None, 0, np.nan)
+    counts, edges = np.histogram(x, bins=bins)
+    gx, dens = fft_kde(x, x.min(), x.max())
+    curve = None if dens is None else dens * len(x) * (edges[1] - edges[0])
+    return HistKDE(edges, counts, gx, curve, len(x), float(x.mean()))
+
+def violin_stats(values):
+    """小提琴图素材：数据范围内的核密度与箱线统计量"""
+    x = _finite(values)
+    if not len(x):
+        return None
+    q1, med, q3 = np.percentile(x, [25, 50, 75])
+    iqr = q3 - q1
+    gx, dens = fft_kde(x, x.min(), x.max())
+    return ViolinStats(gx, dens, q1, med, q3, x[x >= q1 - 1.5 * iqr].min(), x[x <= q3 + 1.5 * iqr].max(), len(x))
+
+def trend_band(df, x, y):
+    """按 x 取值分组的均值 ± 标准差（对应 sns.lineplot(errorbar='sd')）"""
+    g = df[[x, y]].dropna().groupby(x)[y]
+    mean = g.mean()
+    return TrendBand(mean.index.to_numpy(dtype=float), mean.to_numpy(), g.std().reindex(mean.index).to_numpy())
+
+def distribution_summary(df, df_p):
+    """单个产业全部分布类图表的摘要数组（年限 / 资质直方图、年限梯队直方图、规模小提琴、年限趋势带）"""
+    return DistSummary(
+        age=hist_kde(df['企业年限']),
+        qual=hist_kde(df['资质总量_f']),
+        age_rows={c: {g: hist_kde(s, 'auto') for g, s in df_p.groupby('年限梯队', observed=True)[c]} for c in SCORE_COLS},
+        violins={c: {g: violin_stats(s) for g, s in df_p.groupby('企业划型名称', observed=True)[c]} for c in SCORE_COLS},
+        trends={c: trend_band(df_p, '企业年限', c) for c in SCORE_COLS},
+    )
+
+# --- 只读共享数据 ---
+CAPITAL_BINS = [0, 100, 500, 1000, 5000, 10000, np.inf]
+CAPITAL_LABELS = ['<100万', '100-500万', '500-1000万', '1000-5000万', '5000万-1亿', '>1亿']
+SharedData = namedtuple('SharedData', 'df_all df_mets companies dedup')
+
+def capital_counts(capital):
+    """注册资本（万元）各区间的企业数，按区间顺序（含计数为 0 的区间）"""
+    bins = pd.cut(capital, bins=CAPITAL_BINS, labels=CAPITAL_LABELS, include_lowest=True)
+    return bins.value_counts(sort=False)
+
+def build_shared(df_all, df_mets, companies):
+    """进程内共享的只读数据：清洗后的全量表、产业指标表、企业索引（index_utils.CompanyIndex）及其按公司去重视图。
+
+    各会话直接引用同一份对象；pandas 写时复制保证派生视图上的修改不会回写共享表，
+    调用方不得在共享表上原地增删列（plot_* 由 visual_utils.plotter 检查）。
+    """
+    return SharedData(df_all, df_mets, companies, companies.dedup())
+
+# --- 产业深度解析 ---
+ClusterProfile = namedtuple('ClusterProfile', 'name rows df df_p scale_counts region_counts capital_counts age_means fits bubble_fit dists')
+
+def cluster_slices(df_all):
+    """各产业集群在 df_all 中的连续行区间（load_all_data 按文件顺序拼接，同一产业必然相邻）"""
+    names = df_all['所属产业集群'].to_numpy()
+    bounds = np.r_[0, np.flatnonzero(names[1:] != names[:-1]) + 1, len(names)]
+    slices = {names[s]: slice(s, e) for s, e in zip(bounds[:-1], bounds[1:])}
+    if len(slices) != len(bounds) - 1:  # 下游按行区间切片（FilterIndex.positions 等依赖 start / stop），不能退化为行位置数组
+        raise ValueError("df_all 中同一产业集群的行不连续")
+    return slices
+
+def build_cluster_profile(df_all, name, sl, cube=None):
+    """单个产业的深度解析素材：规模 / 资本 / 年限 / 风险 / 资质 / 区县 / 指标联动 / 融资 / 年限演进。
+
+    sl 为行区间或行位置数组；不传 cube 时直接在切片上统计（用于筛选后的子集）。
+    """
+    df = df_all.iloc[sl]  # 连续区间切片，不复制整表
+    df_p = df[df['专利数量_f'] > 0]
+    if cube is None:
+        # 紧凑布局下为分类列，value_counts 会带出计数为 0 的类别
+        scale_counts, region_counts = (df[c].value_counts().loc[lambda v: v > 0] for c in ('企业划型名称', '区县'))
+        age_means = {c: df_p.groupby('年限梯队', observed=True)[c].mean() for c in SCORE_COLS}
+    else:
+        scale_counts = cube.counts('企业划型名称', 所属产业集群=name)
+        region_counts = cube.counts('区县', 所属产业集群=name)
+        age_means = {c: cube.mean(c, '年限梯队', 所属产业集群=name, 有专利=True) for c in SCORE_COLS}
+    return ClusterProfile(
+        name=name, rows=sl, df=df, df_p=df_p,
+        scale_counts=scale_counts, region_counts=region_counts, capital_counts=capital_counts(df['注册资本_f']),
+        age_means=age_means,
+        fits={c: linear_fit(df_p, '专利数量_f', c) for c in SCORE_COLS},
+        bubble_fit=linear_fit(df_p, '支撑得分', '护城河得分'),
+        dists=distribution_summary(df, df_p),
+    )
+
+def rebase_cluster_profile(prof, df_all, sl):
+    """内容未变的产业在新 df_all 中换了行区间：只重新定位行与切片，沿用已算好的统计"""
+    df = df_all.iloc[sl]
+    return prof._replace(rows=sl, df=df, df_p=df[df['专利数量_f'] > 0])
+
+@traced()
+def build_cluster_profiles(df_all, cube=None):
+    """一次性预计算全部产业的深度解析素材，切换产业时无需再读盘或重算"""
+    cube = cube or AggregateCube(df_all)
+    return {name: build_cluster_profile(df_all, name, sl, cube) for name, sl in cluster_slices(df_all).items()}
+
+# --- 工作簿读取与列式缓存 ---
+def list_chain_files(data_dir):
+    """列出数据目录下的产业工作簿（忽略 Excel 锁文件）"""
+    return sorted(f for f in os.listdir(data_dir) if f.endswith(".xlsx") and not f.startswith("~$"))
+
+def _stat_sig(fp):
+    return fp["mtime"], fp["size"]
+
+def file_fingerprint(path, prev=None):
+    """源文件指纹：大小 + 修改时间 + 内容哈希；大小与时间未变时沿用旧哈希"""
+    stat = os.stat(path)
+    fp = {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+    if prev and prev.get("size") == fp["size"] and prev.get("mtime") == fp["mtime"]:
+        fp["sha1"] = prev["sha1"]
+        return fp
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    fp["sha1"] = h.hexdigest()
+    return fp
+
+def load_chain_file(path):
+    """读取单个产业工作簿并完成清洗（openpyxl 以只读流式模式打开）"""
+    with span("read_excel", "data_utils", file=os.path.basename(path)):
+        raw = pd.read_excel(path, engine="openpyxl")
+    return process_chain_data(raw)
+
+def chain_metrics(df):
+    """单个产业的汇总指标（对应 df_mets 的一行）"""
+    return {"企业数量": int(df['公司名称'].nunique()), "平均资质数": float(df['资质总量_f'].mean())}
+
+def _ingest_file(path):
+    # 进程池任务：解析 + 清洗 + 汇总指标
+    df = load_chain_file(path)
+    return df, chain_metrics(df)
+
+def _ingest_file_safe(path):
+    # 进程池任务：解析失败时返回异常而不中断整批（异常转为 RuntimeError，保证可跨进程回传）
+    try:
+        return _ingest_file(path)
+    except Exception as e:
+        return RuntimeError(f"{type(e).__name__}: {e}")
+
+def _ingest_files(paths, workers=None, return_exceptions=False):
+    """解析一组工作簿；workers > 1 时分发到进程池，失败时退回串行。
+
+    进程池用 spawn 启动：看板服务进程内有 Tornado 事件循环、脚本线程与渲染线程池，
+    fork 会把其他线程持有的锁原样复制进子进程，可能死锁。
+    return_exceptions=True 时单个文件的解析异常作为结果返回，其余文件照常解析。
+    """
+    task = _ingest_file_safe if return_exceptions else _ingest_file
+    if workers is None:
+        workers = int(os.environ.get("LOAD_WORKERS", 0)) or os.cpu_count() or 1
+    workers = min(workers, len(paths))
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                return list(pool.map(task, paths))
+        except (OSError, BrokenProcessPool) as e:
+            print(f"⚠️ 警告：并行解析不可用（{e}），改为串行读取。")
+    return [task(p) for p in paths]
+
+def _read_manifest(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest.get("files", {}) if manifest.get("version") == CACHE_VERSION else {}
+
+def _write_manifest(cache_dir, entries):
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"version": CACHE_VERSION, "files": entries}, f, ensure_ascii=False, indent=1)
+    os.replace(path + ".tmp", path)
+    # 清理已无源文件对应的过期缓存
+    live = {e["fingerprint"]["sha1"] + ".parquet" for e in entries.values()}
+    for f in os.listdir(cache_dir):
+        if f.endswith(".parquet") and f not in live:
+            os.remove(os.path.join(cache_dir, f))
+
+def _write_parquet(df, path):
+    """写入 Parquet；含无法序列化的混合类型列时放弃缓存该文件"""
+    try:
+        df.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        return True
+    except (ValueError, TypeError, ImportError) as e:
+        print(f"⚠️ 警告：列式缓存写入失败（{e}），该文件下次仍将重新解析。")
+        if os.path.exists(path + ".tmp"): os.remove(path + ".tmp")
+        return False
+
+def _load_files(data_dir, files, fps, entries, cache_dir=None, workers=None, failed=None):
+    """读取一组工作簿，返回 ({文件名: (df, 汇总指标)}, 未能写入列式缓存的文件集合)。
+
+    指定 cache_dir 时，指纹 (fps) 与 manifest 记录 (entries) 一致且 Parquet 存在的文件直接读缓存，
+    其余文件分发解析后写回缓存。传入 failed 字典时，解析失败的文件记入 {文件名: 异常} 并跳过，
+    否则异常直接抛出。
+    """
+    loaded, todo, uncached = {}, [], set()
+    for f in files:
+        if cache_dir is not None:
+            old, fp = entries.get(f), fps[f]
+            cached = os.path.join(cache_dir, fp["sha1"] + ".parquet")
+            if old and old["fingerprint"]["sha1"] == fp["sha1"] and os.path.exists(cached):
+                with span("read_parquet", "data_utils", file=f):
+                    loaded[f] = pd.read_parquet(cached), old["mets"]
+                continue
+        todo.append(f)
+
+    with span("ingest_files", "data_utils", files=len(todo)):
+        parsed = _ingest_files([os.path.join(data_dir, f) for f in todo], workers, return_exceptions=failed is not None)
+    for f, result in zip(todo, parsed):
+        if isinstance(result, Exception):
+            failed[f] = result
+            continue
+        loaded[f] = df_tmp, met = result
+        if cache_dir is not None and not _write_parquet(df_tmp, os.path.join(cache_dir, fps[f]["sha1"] + ".parquet")):
+            uncached.add(f)
+    return loaded, uncached
+
+def _assemble(files, loaded, special_list=(), compact=False):
+    """按文件顺序拼接各产业数据，返回 (df_all, df_mets)"""
+    all_raw, mets = [], []
+    for f in files:
+        name = f.replace(".xlsx", "")
+        df_tmp, met = loaded[f]
+        mets.append({"产业名称": name, **met, "分类": "重点产业" if name in special_list else "其他产业"})
+        df_tmp['所属产业集群'] = name
+        all_raw.append(df_tmp)
+    df_all = pd.concat(all_raw, ignore_index=True)
+    return (compact_frame(df_all) if compact else df_all), pd.DataFrame(mets)
+
+@traced()
+def load_all_data(data_dir, special_list=(), cache_dir=None, workers=None, compact=False):
+    """读取并清洗全部产业工作簿，返回 (df_all, df_mets)。
+
+    指定 cache_dir 时，清洗后的数据以 Parquet 按源文件内容哈希缓存，
+    汇总指标记录在 manifest.json 中；热启动不再经过 openpyxl，
+    冷启动仅重新解析发生变化的工作簿。待解析的工作簿分发到
+    workers 个进程并行处理（默认取 LOAD_WORKERS 环境变量或 CPU 核数，
+    workers=1 为串行）。compact=True 时返回紧凑内存布局（见 compact_frame）。
+    """
+    use_cache = cache_dir is not None and HAS_PARQUET
+    entries, fps = {}, {}
+    if use_cache:
+        os.makedirs(cache_dir, exist_ok=True)
+        entries = _read_manifest(cache_dir)
+
+    files = list_chain_files(data_dir)
+    if use_cache:
+        for f in files:
+            old = entries.get(f)
+            fps[f] = file_fingerprint(os.path.join(data_dir, f), old and old["fingerprint"])
+    loaded, uncached = _load_files(data_dir, files, fps, entries, cache_dir if use_cache else None, workers)
+
+    if use_cache:
+        _write_manifest(cache_dir, {f: {"fingerprint": fps[f], "mets": loaded[f][1]} for f in files if f not in uncached})
+    return _assemble(files, loaded, special_list, compact)
+
+# --- 数据目录增量监视 ---
+class ChainStore:
+    """数据目录的增量视图：轮询工作簿的新增 / 修改 / 删除（忽略 ~$ 锁文件），
+    只重新解析变化的文件并拼接回 df_all / df_mets。
+
+    version 在数据实际变化时递增，下游缓存以 (目录, version) 为键，changes 只保留最近 history 个版本的增量；
+    profiles() 只重建内容变化的产业，其余产业沿用已算好的统计。
+    目录中没有任何工作簿时 df_all / df_mets 为 None（首次载入）或保留上一版本。
+    个别工作簿解析失败（如仍在写入）时照常应用其余文件，失败文件沿用上一版本（新增的则暂不载入），
+    并记下其 (修改时间, 大小)，文件再次变化前不再重试。
+    """
+
+    def __init__(self, data_dir, special_list=(), cache_dir=None, workers=None, compact=False, interval=None, history=32):
+        self.data_dir, self.special_list, self.workers, self.compact = data_dir, special_list, workers, compact
+        self.cache_dir = cache_dir if cache_dir is not None and HAS_PARQUET else None
+        if interval is None:
+            interval = float(os.environ.get("DATA_WATCH_INTERVAL", 2))
+        self.interval = interval
+        self.entries = {}
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.entries = _read_manifest(self.cache_dir)
+        self.fps, self.parts, self.uncached, self.failed = {}, {}, set(), {}
+        self.df_all = self.df_mets = None
+        self.version, self.changes, self.history = 0, {}, history
+        self._profiles = {}
+        self._emptied = False
+        self._checked = 0.0
+        self._lock = threading.RLock()
+        self.refresh(force=True)
+
+    def scan(self):
+        """对比目录现状与已载入文件的指纹，返回 (新指纹, 新增, 修改, 删除)"""
+        fps = {}
+        for f in list_chain_files(self.data_dir):
+            prev = self.fps.get(f) or (self.entries.get(f) or {}).get("fingerprint")
+            try:
+                fps[f] = file_fingerprint(os.path.join(self.data_dir, f), prev)
+            except FileNotFoundError:  # 扫描期间被删除
+                continue
+        added = [f for f in fps if f not in self.fps]
+        modified = [f for f in fps if f in self.fps and fps[f]["sha1"] != self.fps[f]["sha1"]]
+        removed = [f for f in self.fps if f not in fps]
+        return fps, added, modified, removed
+
+    def refresh(self, force=False):
+        """距上次检查超过 interval 秒时扫描目录并应用增量；返回本次数据是否变化"""
+        now = time.monotonic()
+        if not force and now - self._checked < self.interval:
+            return False
+        with self._lock:
+            self._checked = now
+            fps, added, modified, removed = self.scan()
+            self.failed = {f: sig for f, sig in self.failed.items() if f in fps and sig == _stat_sig(fps[f])}
+            added = [f for f in added if f not in self.failed]
+            modified = [f for f in modified if f not in self.failed]
+            if not (added or modified or removed):
+                self.fps = self._applied(fps)  # 仅修改时间变化（内容哈希相同）时更新指纹，下次免重新哈希
+                return False
+            if not fps:
+                # 工作簿被全部移走（如整体替换数据）：空数据无法拼接，保留上一版本，放回文件后按增量载入
+                if not self._emptied:
+                    print("⚠️ 警告：数据目录中已没有产业工作簿，继续使用上一版本数据。")
+                    self._emptied = True
+                return False
+            self._emptied = False
+            todo = added + modified
+            with span("delta_reload", "data_utils", added=len(added), modified=len(modified), removed=len(removed)):
+                failed = {}
+                try:
+                    loaded, uncached = _load_files(self.data_dir, todo, fps, self.entries, self.cache_dir, self.workers, failed)
+                    for f, e in failed.items():
+                        # 工作簿可能仍在写入中：该文件沿用上一版本，待其再次变化后重试
+                        print(f"⚠️ 警告：{f} 解析失败（{e}），文件更新前不再重试。")
+                        self.failed[f] = _stat_sig(fps[f])
+                    added = [f for f in added if f in loaded]
+                    modified = [f for f in modified if f in loaded]
+                    parts = {f: p for f, p in {**self.parts, **loaded}.items() if f in fps}
+                    if not parts:
+                        raise next(iter(failed.values()))
+                    if not (added or modified or removed):
+                        self.fps = self._applied(fps)
+                        return False
+                    df_all, df_mets = _assemble(sorted(parts), parts, self.special_list, self.compact)
+                except Exception as e:
+                    if self.df_all is None:
+                        raise
+                    # 缓存读取等整体失败：保留旧数据，下次轮询重试
+                    print(f"⚠️ 警告：增量载入失败（{e}），继续使用上一版本数据。")
+                    return False
+                self.parts, self.df_all, self.df_mets = parts, df_all, df_mets
+                self.uncached = (self.uncached - set(loaded) - set(removed)) | uncached
+                self.fps = self._applied(fps)
+                if self.cache_dir:
+                    self.entries = {f: {"fingerprint": self.fps[f], "mets": self.parts[f][1]} for f in sorted(parts) if f not in self.uncached}
+                    _write_manifest(self.cache_dir, self.entries)
+                self.version += 1
+                self.changes[self.version] = {"added": added, "modified": modified, "removed": removed}
+                self.changes.pop(self.version - self.history, None)
+            return True
+
+    def _applied(self, fps):
+        # 已应用的指纹：解析失败的文件保留上次成功载入时的指纹，新增即失败的文件不计入
+        return {f: self.fps[f] if f in self.failed else fp for f, fp in fps.items()
+                if f not in self.failed or f in self.fps}
+
+    def snapshot(self):
+        """(version, df_all, df_mets)：同一锁内读取，三者互相一致"""
+        with self._lock:
+            return self.version, self.df_all, self.df_mets
+
+    def profiles(self, df_all, cube=None):
+        """全部产业的深度解析素材；以各产业切片的内容指纹判断是否需要重算，未变化的产业只重新定位行区间"""
+        # 逐行哈希不含行号：前面的产业增删行导致整体平移时，内容指纹不变
+        schema = repr((list(df_all.columns), list(map(str, df_all.dtypes)))).encode()
+        row_hash = pd.util.hash_pandas_object(df_all, index=False).to_numpy()
+        out = {}
+        with self._lock:
+            for name, sl in cluster_slices(df_all).items():
+                token = hashlib.sha1(schema + row_hash[sl].tobytes()).hexdigest()
+                old = self._profiles.get(name)
+                if old is not None and old[0] == token:
+                    out[name] = token, rebase_cluster_profile(old[1], df_all, sl)
+                else:
+                    cube = cube or AggregateCube(df_all)
+                    with span("build_cluster_profile", "data_utils", cluster=name):
+                        out[name] = token, build_cluster_profile(df_all, name, sl, cube)
+            self._profiles = out
+        return {name: prof for name, (_, prof) in out.items()}
@@ -0,0 +1,220 @@
+"""离线批量导出：为每个产业集群生成 HTML / PDF 报告包（图表 + 自动统计解读）。
+
+用法：
+    python export_reports.py --out exports                     # 全部产业，HTML + PDF
+    python export_reports.py --clusters 科技机器人类 --format html
+    python export_reports.py --force --workers 4               # 忽略增量清单，全部重新导出
+
+每个产业在进程池中独立渲染（Agg 后端）；输出目录下的 manifest.json 记录每个产业的
+输入指纹（数据 + 绘图代码 + 导出参数），未变化的产业直接跳过。
+"""
+import os
+import json
+import base64
+import hashlib
+import argparse
+import html
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import pandas as pd
+import data_utils as du
+import visual_utils as vis
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+CACHE_DIR = os.path.join(BASE_DIR, ".cache")
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+LABELS = {'支撑得分': '业务支撑指数', '护城河得分': '技术护城河深度', '覆盖得分': '产品技术覆盖率'}
+TREND_COLORS = {'支撑得分': 'royalblue', '护城河得分': 'seagreen', '覆盖得分': 'orange'}
+SCALE_ORDER = ['大型', '中型', '小型', '微型']
+AGE_ORDER = ['青年企业(≤5年)', '中坚企业(6-15年)', '老牌企业(>15年)']
+
+# --- 1. 自动统计解读 ---
+def _pct(part, whole):
+    return f"{part / whole:.1%}" if whole else "—"
+
+def _fmt(v, nd=1):
+    return "—" if pd.isna(v) else f"{v:.{nd}f}"
+
+def cluster_commentary(prof):
+    """由数据直接生成的各章节解读（与看板中科技机器人类的人工解读相对应）"""
+    df, df_p = prof.df, prof.df_p
+    n = len(df)
+    sc, rc = prof.scale_counts, prof.region_counts
+    cap, age, qual = df['注册资本_f'], df['企业年限'].dropna(), df['资质总量_f']
+    risk = pd.Series(du.risk_matrix(df).sum(axis=0), index=du.RISK_COLS).sort_values(ascending=False)
+    risky = int(du.risk_matrix(df).any(axis=1).sum())
+    notes = {
+        '规模': [f"共 {n} 家企业；微型与小型企业合计占 {_pct(sc.get('微型', 0) + sc.get('小型', 0), sc.sum())}，"
+               f"大型企业 {int(sc.get('大型', 0))} 家。"] if sc.sum() else [f"共 {n} 家企业；工作簿未提供企业划型字段。"],
+        '资本': [f"注册资本 1000 万元以下的企业占 {_pct(int((cap < 1000).sum()), int(cap.notna().sum()))}，"
+               f"5000 万元以上 {int((cap > 5000).sum())} 家。"],
+        '年限': [f"企业年限中位数 {_fmt(age.median(), 0)} 年，成立 5 年以内的占 {_pct(int((age <= 5).sum()), len(age))}。"],
+        '风险': [f"至少命中一项风险的企业 {risky} 家（{_pct(risky, n)}）；"
+               f"最多的风险项为“{risk.index[0]}”（{int(risk.iloc[0])} 家）。" if risky else "未发现命中风险项的企业。"],
+        '资质': [f"资质总量中位数 {_fmt(qual.median(), 0)}，15 项以内的企业占 {_pct(int((qual <= 15).sum()), int(qual.notna().sum()))}。"],
+        '地理': [f"{rc.index[0]}企业最多（{int(rc.iloc[0])} 家，占 {_pct(int(rc.iloc[0]), rc.sum())}），"
+               f"前三区县合计占 {_pct(int(rc.iloc[:3].sum()), rc.sum())}。"] if len(rc) else [],
+        '指标联动': [], '研发聚焦': [], '资本审美': [], '年限演进': [],
+    }
+    for col, label in LABELS.items():
+        fit = prof.fits[col]
+        by_scale = df_p.groupby('企业划型名称', observed=True)[col].mean().reindex(SCALE_ORDER).dropna()
+        notes['指标联动'].append(f"{label}：与专利数量的相关系数 R={_fmt(fit.r, 2) if fit else 'NA'}；各规模均值 "
+                             + "、".join(f"{k} {_fmt(v)}" for k, v in by_scale.items()) + "。")
+        by_fund = df_p.groupby('是否融资', observed=True)[col].mean()
+        notes['资本审美'].append(f"{label}：获投企业均值 {_fmt(by_fund.get('获投企业'))}，未获投 {_fmt(by_fund.get('未获投'))}。")
+        means = prof.age_means[col]
+        notes['年限演进'].append(f"{label}：" + "、".join(f"{g} {_fmt(means.get(g))}" for g in AGE_ORDER) + "。")
+    bf = prof.bubble_fit
+    notes['研发聚焦'].append(f"业务支撑指数与技术护城河深度的相关系数 R={_fmt(bf.r, 2) if bf else 'NA'}"
+                         f"（样本 {len(df_p)} 家有专利企业）。")
+    return notes
+
+# --- 2. 报告结构（与看板深度解析页一致） ---
+def cluster_sections(prof):
+    """[(章节, 解读键, [(绘图函数, args, kwargs), ...]), ...]"""
+    name, df, df_p = prof.name, prof.df, prof.df_p
+    r_of = lambda fit: round(fit.r, 2) if fit else 'NA'
+    return [
+        ("一、规模结构", '规模', [(vis.plot_scale_pie, (None, f"{name}企业规模分布"), {"counts": prof.scale_counts})]),
+        ("二、注册资本", '资本', [(vis.plot_capital_dist, (None,), {"counts": prof.capital_counts})]),
+        ("三、成立年限", '年限', [(vis.plot_age_dist, (df, f"{name}企业成立年限分布"), {})]),
+        ("四、风险", '风险', [(vis.plot_risk_barh, (df,), {})]),
+        ("五、资质", '资质', [(vis.plot_qual_dist, (df,), {})]),
+        ("六、区县分布", '地理', [(vis.plot_region_bar, (None, f"{name}企业区县分布"), {"counts": prof.region_counts})]),
+        ("七、核心指标联动", '指标联动', [c for col, label in LABELS.items() for c in (
+            (vis.plot_metric_trend, (df_p, col, label, r_of(prof.fits[col])), {}),
+            (vis.plot_metric_violin, (df_p, col, label), {}))]),
+        ("八、研发聚焦度 vs. 技术护城河深度", '研发聚焦', [(vis.plot_bubble_chart, (df_p,), {})]),
+        ("九、资本市场筛选效应", '资本审美', [(vis.plot_funding_box, (df_p, col, label), {}) for col, label in LABELS.items()]),
+        ("十、成立年限演进", '年限演进', [c for col, label in LABELS.items() for c in (
+            (vis.plot_age_matrix_row, (df_p, col, label), {"means": prof.age_means[col]}),
+            (vis.plot_time_trend_sd, (df_p, col, label, TREND_COLORS[col]), {}))]),
+    ]
+
+# --- 3. 单个产业渲染（进程池任务） ---
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+
+def _pdf_text_page(pdf, title, lines):
+    fig = vis.plt.figure(figsize=(8.27, 11.69))
+    fig.text(0.08, 0.95, title, fontproperties=vis.my_font, fontsize=16, fontweight='bold', va='top')
+    fig.text(0.08, 0.90, "\n\n".join(lines), fontproperties=vis.my_font, fontsize=10, va='top', wrap=True)
+    pdf.savefig(fig)
+    vis.plt.close(fig)
+
+def render_cluster(prof, out_dir, formats=("html", "pdf"), dpi=120):
+    """渲染单个产业的全部图表与解读，写出 report.html / report.pdf，返回写出的文件列表"""
+    from matplotlib.backends.backend_pdf import PdfPages
+    vis.init_plotting()
+    notes = cluster_commentary(prof)
+    os.makedirs(out_dir, exist_ok=True)
+    pdf = PdfPages(os.path.join(out_dir, "report.pdf")) if "pdf" in formats else None
+    body = []
+    try:
+        if pdf: _pdf_text_page(pdf, f"{prof.name}产业链画像", [f"【{k}】" + " ".join(v) for k, v in notes.items() if v])
+        for title, key, charts in cluster_sections(prof):
+            body.append(f"<h2>{html.escape(title)}</h2>")
+            body += [f"<p>{html.escape(t)}</p>" for t in notes[key]]
+            for func, args, kwargs in charts:
+                with vis.managed_figures():
+                    fig = func(*args, **kwargs)
+                    if pdf: pdf.savefig(fig, bbox_inches="tight")
+                    png = vis.figure_bytes(fig, "png", dpi)
+                body.append(f'<img src="data:image/png;base64,{base64.b64encode(png).decode()}">')
+    finally:
+        if pdf: pdf.close()
+    written = ["report.pdf"] if pdf else []
+    if "html" in formats:
+        page = (f'<!DOCTYPE html><html lang="zh"><head><meta charset="utf-8"><title>{html.escape(prof.name)}产业链画像</title>'
+                '<style>body{max-width:1100px;margin:auto;font-family:sans-serif}img{max-width:100%}</style></head>'
+                f'<body><h1>{html.escape(prof.name)}产业链画像</h1>{"".join(body)}</body></html>')
+        with open(os.path.join(out_dir, "report.html"), "w", encoding="utf-8") as f:
+            f.write(page)
+        written.append("report.html")
+    return prof.name, written
+
+# --- 4. 增量清单 ---
+def _code_token():
+    # 绘图 / 清洗 / 导出代码任一变更都会使全部产业重新导出
+    h = hashlib.sha1()
+    for mod in ("data_utils.py", "visual_utils.py", "export_reports.py"):
+        with open(os.path.join(BASE_DIR, mod), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def input_key(prof, formats, dpi, code):
+    raw = "|".join([du.frame_fingerprint(prof.df), code, ",".join(sorted(formats)), str(dpi)])
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def _read_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest.get("clusters", {}) if manifest.get("version") == MANIFEST_VERSION else {}
+
+def _write_manifest(out_dir, entries):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "clusters": entries}, f, ensure_ascii=False, indent=1)
+    os.replace(path + ".tmp", path)
+
+# --- 5. 批量导出 ---
+def export_all(out_dir, clusters=None, formats=("html", "pdf"), dpi=120, workers=None, force=False, data_dir=DATA_DIR):
+    """导出全部（或指定）产业；返回 {产业: "exported" | "skipped"}"""
+    _init_worker()
+    df_all, _ = du.load_all_data(data_dir, cache_dir=CACHE_DIR)
+    profiles = du.build_cluster_profiles(df_all)
+    unknown = set(clusters or ()) - set(profiles)
+    if unknown:
+        raise KeyError(f"未知产业：{sorted(unknown)}")
+    os.makedirs(out_dir, exist_ok=True)
+    entries, code, status, todo = _read_manifest(out_dir), _code_token(), {}, []
+    for name in clusters or profiles:
+        key = input_key(profiles[name], formats, dpi, code)
+        files = [f"report.{fmt}" for fmt in formats]
+        done = all(os.path.exists(os.path.join(out_dir, name, f)) for f in files)
+        if not force and done and entries.get(name, {}).get("key") == key:
+            status[name] = "skipped"
+            print(f"⏭️ {name}：输入未变化，跳过")
+        else:
+            todo.append((name, key))
+
+    def finish(name, key, written):
+        entries[name] = {"key": key, "files": written}
+        status[name] = "exported"
+        _write_manifest(out_dir, entries)
+        print(f"✅ {name}：{', '.join(written)}")
+
+    keys = dict(todo)
+    workers = min(workers or int(os.environ.get("LOAD_WORKERS", 0)) or os.cpu_count() or 1, max(len(todo), 1))
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                futs = [pool.submit(render_cluster, profiles[n], os.path.join(out_dir, n), formats, dpi) for n, _ in todo]
+                for fut in as_completed(futs):
+                    name, written = fut.result()
+                    finish(name, keys[name], written)
+            return status
+        except (OSError, BrokenProcessPool) as e:
+            print(f"⚠️ 警告：并行导出不可用（{e}），改为串行导出。")
+    for name, key in todo:
+        if name not in status:
+            finish(name, key, render_cluster(profiles[name], os.path.join(out_dir, name), formats, dpi)[1])
+    return status
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量导出各产业集群的 HTML / PDF 报告包")
+    parser.add_argument("--out", default=os.path.join(BASE_DIR, "exports"))
+    parser.add_argument("--clusters", nargs="+", help="只导出指定产业（默认全部）")
+    parser.add_argument("--format", nargs="+", choices=["html", "pdf"], default=["html", "pdf"], dest="formats")
+    parser.add_argument("--dpi", type=int, default=120)
+    parser.add_argument("--workers", type=int, help="并行进程数（默认取 LOAD_WORKERS 或 CPU 核数）")
+    parser.add_argument("--force", action="store_true", help="忽略增量清单，全部重新导出")
+    args = parser.parse_args()
+    export_all(args.out, args.clusters, tuple(args.formats), args.dpi, args.workers, args.force)
@@ -0,0 +1,438 @@
+import functools
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from data_utils import RISK_COLS, RISK_MASK_COL, SCORE_COLS, pack_risk_flags
+
+try:
+    import scipy.sparse as sp  # 稀疏关联矩阵；缺失时退回稠密布尔矩阵
+    HAS_SCIPY = True
+except ImportError:
+    sp = None
+    HAS_SCIPY = False
+
+# --- 1. 风险位图索引 ---
+# 256 种位图取值 × 7 项风险的展开表：第 v 行即位图 v 命中的风险项
+_RISK_LUT = ((np.arange(256)[:, None] >> np.arange(len(RISK_COLS))) & 1).astype(np.int64)
+
+def risk_bits(*names):
+    """风险项名称 → 位掩码"""
+    unknown = set(names) - set(RISK_COLS)
+    if unknown:
+        raise KeyError(f"未知风险项：{sorted(unknown)}")
+    return sum(1 << RISK_COLS.index(n) for n in names)
+
+class RiskIndex:
+    """风险位图索引：加载时把每家企业的七项风险编码为 uint8 位图。
+
+    组合筛查（任一 / 全部 / 均无）是一次按位运算；统计先对位图取值做
+    256 桶计数，再与展开表相乘，分组统计与共现矩阵都不再逐列扫描字符串。
+    """
+
+    def __init__(self, df, group_cols=('所属产业集群', '区县')):
+        self.bits = (df[RISK_MASK_COL].to_numpy(np.uint8) if RISK_MASK_COL in df.columns
+                     else pack_risk_flags(df))
+        self.index = df.index
+        self._groups = {c: pd.factorize(df[c], sort=True) for c in group_cols if c in df.columns}
+
+    def any_of(self, *names):
+        return (self.bits & risk_bits(*names)) != 0
+
+    def all_of(self, *names):
+        m = risk_bits(*names)
+        return (self.bits & m) == m
+
+    def none_of(self, *names):
+        return (self.bits & risk_bits(*names)) == 0
+
+    def query(self, any_of=(), all_of=(), none_of=()):
+        """组合条件，返回布尔掩码；空条件视为不限制"""
+        mask = np.ones(len(self.bits), dtype=bool)
+        if any_of: mask &= self.any_of(*any_of)
+        if all_of: mask &= self.all_of(*all_of)
+        if none_of: mask &= self.none_of(*none_of)
+        return mask
+
+    def _hist(self, rows=None):
+        bits = self.bits if rows is None else self.bits[rows]
+        return np.bincount(bits, minlength=256)
+
+    def counts(self, rows=None):
+        """各风险项命中企业数；rows 为可选的行位置 / 切片 / 布尔掩码"""
+        return pd.Series(self._hist(rows) @ _RISK_LUT, index=RISK_COLS)
+
+    def counts_by(self, col):
+        """按产业集群或区县分组的风险项命中数（分组 × 风险项）"""
+        codes, uniques = self._groups[col]
+        valid = codes >= 0
+        flat = np.bincount(codes[valid].astype(np.int64) * 256 + self.bits[valid], minlength=len(uniques) * 256)
+        return pd.DataFrame(flat.reshape(len(uniques), 256) @ _RISK_LUT, index=pd.Index(uniques, name=col),
+                            columns=RISK_COLS)
+
+    def cooccurrence(self, rows=None):
+        """风险项共现矩阵：对角线为单项命中数，(i, j) 为同时命中 i 与 j 的企业数"""
+        hist = self._hist(rows)
+        return pd.DataFrame(_RISK_LUT.T @ (_RISK_LUT * hist[:, None]), index=RISK_COLS, columns=RISK_COLS)
+
+# --- 2. 交互筛选引擎 ---
+FILTER_DIMS = ['区县', '企业划型名称', '年限梯队', '是否融资']
+
+# 图表 → 其自身展示的维度：交叉筛选惯例下，图表不受自身维度上的筛选影响，
+# 该维度的筛选变化时这些图表的输入不变，直接命中图像缓存
+CHART_OWN_DIMS = {
+    'plot_scale_pie': ('企业划型名称',),
+    'plot_region_bar': ('区县',),
+    'plot_age_dist': ('年限梯队',),
+    'plot_metric_violin': ('企业划型名称',),
+    'plot_funding_box': ('是否融资',),
+    'plot_age_matrix_row': ('年限梯队',),
+    'plot_time_trend_sd': ('年限梯队',),
+}
+
+def _nbytes(obj):
+    """缓存条目的近似字节数：数组 / 数据表按缓冲区大小，元组（含画像等 namedtuple）逐项累加，其余记 0"""
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(np.sum(obj.memory_usage(index=True)))
+    if isinstance(obj, tuple):
+        return sum(_nbytes(o) for o in obj)
+    return 0
+
+class FilterIndex:
+    """交互筛选引擎：加载时为每个维度取值预建位图，为每个得分列预建排序索引。
+
+    筛选状态为 {维度: 取值列表, 得分列: (下限, 上限)}。同一维度内多个取值按位或，
+    不同维度按位与；得分区间用 searchsorted 在排序索引上二分定位。
+    结果按规范化后的筛选状态做 LRU 缓存（条目数与字节数双重限额；引擎在会话间共享，缓存操作互斥）。
+    """
+
+    def __init__(self, df, dims=FILTER_DIMS, ranges=SCORE_COLS, cache_size=64, max_bytes=128 * 2**20):
+        self.n = len(df)
+        self.bitmaps = {}
+        for d in dims:
+            codes, uniques = pd.factorize(df[d], sort=True)
+            self.bitmaps[d] = {v: np.packbits(codes == i) for i, v in enumerate(uniques)}
+        self.sorted = {}
+        for c in ranges:
+            vals = df[c].to_numpy(dtype=float)
+            order = np.argsort(vals, kind='stable')[:int(np.count_nonzero(~np.isnan(vals)))]  # NaN 排在末尾，剔除
+            self.sorted[c] = vals[order], order
+        self._cache, self._cache_size, self.max_bytes, self._size = OrderedDict(), cache_size, max_bytes, 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def values(self, dim):
+        return list(self.bitmaps[dim])
+
+    def bounds(self, col):
+        vals = self.sorted[col][0]
+        return (float(vals[0]), float(vals[-1])) if len(vals) else (0.0, 100.0)
+
+    def normalize(self, state, chart=None):
+        """去掉不起作用的条件（空选 / 全选 / 全区间）与图表自身维度，得到可哈希的筛选键"""
+        own = CHART_OWN_DIMS.get(chart, ())
+        key = []
+        for name, cond in sorted(state.items()):
+            if name in own or not cond:
+                continue
+            if name in self.bitmaps:
+                vals = tuple(sorted(set(cond) & set(self.bitmaps[name])))
+                if len(vals) < len(self.bitmaps[name]):
+                    key.append((name, vals))
+            elif name in self.sorted:
+                lo, hi = self.bounds(name)
+                if cond[0] > lo or cond[1] < hi:
+                    key.append((name, (float(cond[0]), float(cond[1]))))
+        return tuple(key)
+
+    def memo(self, key, build):
+        """按筛选键缓存任意派生结果（掩码、行位置、子集画像等）。
+
+        build 在锁外执行（其中可能再次调用 memo），并发未命中时各自构建，先写入者保留。
+        """
+        with self._lock:
+            item = self._cache.get(key)
+            if item is not None:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return item[0]
+            self.misses += 1
+        out = build()
+        size = _nbytes(out)
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = out, size
+                self._size += size
+                while len(self._cache) > 1 and (len(self._cache) > self._cache_size or self._size > self.max_bytes):
+                    _, (_, old) = self._cache.popitem(last=False)
+                    self._size -= old
+            return self._cache[key][0]
+
+    def _build_mask(self, key):
+        bits = np.full((self.n + 7) // 8, 0xFF, dtype=np.uint8)
+        ranges = []
+        for name, cond in key:
+            if name in self.bitmaps:
+                sel = np.zeros_like(bits)
+                for v in cond:
+                    sel |= self.bitmaps[name][v]
+                bits &= sel
+            else:
+                ranges.append((name, cond))
+        mask = np.unpackbits(bits, count=self.n).astype(bool)
+        for name, (lo, hi) in ranges:
+            vals, order = self.sorted[name]
+            hit = np.zeros(self.n, dtype=bool)
+            hit[order[np.searchsorted(vals, lo, 'left'):np.searchsorted(vals, hi, 'right')]] = True
+            mask &= hit
+        mask.flags.writeable = False
+        return mask
+
+    def mask(self, state, chart=None):
+        """布尔掩码（只读）；chart 给定时忽略该图表自身维度上的筛选"""
+        key = self.normalize(state, chart)
+        return self.memo(('mask', key), lambda: self._build_mask(key))
+
+    def positions(self, state, chart=None, within=None):
+        """命中行位置；within 为行区间（如某产业在 df_all 中的切片）"""
+        key = self.normalize(state, chart)
+        span = (within.start, within.stop) if within is not None else None
+        def build():
+            pos = np.flatnonzero(self.mask(state, chart))
+            if within is not None:
+                pos = pos[(pos >= within.start) & (pos < within.stop)]
+            pos.flags.writeable = False
+            return pos
+        return self.memo(('pos', key, span), build)
+
+# --- 3. 企业索引 ---
+class CompanyIndex:
+    """企业索引：df_all 每行是一个 (企业, 产业) 组合，这里加载时一次性建立
+    公司名称 → 行位置 / 所属产业集合 的映射、按公司去重的视图，以及检索结构
+    （有序名称数组做前缀查找，单字 + 二元组倒排表做子串查找）。
+    """
+
+    def __init__(self, df):
+        self.df = df
+        codes, self.names = pd.factorize(df['公司名称'], sort=False)
+        self.names = np.asarray(self.names, dtype=object)
+        valid = np.flatnonzero(codes >= 0)
+        order = valid[np.argsort(codes[valid], kind='stable')]
+        # CSR 布局：第 i 家企业的行位置为 self._rows[self._ptr[i]:self._ptr[i + 1]]
+        self._rows = order
+        self._ptr = np.r_[0, np.cumsum(np.bincount(codes[valid], minlength=len(self.names)))]
+        self._codes = codes
+        self._id = {n: i for i, n in enumerate(self.names)}
+        self._clusters = df['所属产业集群'].to_numpy()
+        self._sorted_names = np.sort(self.names.astype(str))
+        grams = {}
+        for i, name in enumerate(self.names):
+            for g in set(name) | {name[k:k + 2] for k in range(len(name) - 1)}:
+                grams.setdefault(g, []).append(i)
+        self._grams = {g: np.array(ids) for g, ids in grams.items()}
+        self._dedup = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._id
+
+    def positions(self, name):
+        """该企业在 df_all 中的全部行位置"""
+        i = self._id[name]
+        return self._rows[self._ptr[i]:self._ptr[i + 1]]
+
+    def clusters(self, name):
+        return sorted(set(self._clusters[self.positions(name)]))
+
+    def first_positions(self, rows=None):
+        """每家企业首次出现的行位置（升序，与 drop_duplicates(keep='first') 一致）；rows 为可选的行位置子集"""
+        if rows is None:
+            return np.sort(self._rows[self._ptr[:-1]])  # 稳定排序保证每段首元素即最小行位置
+        rows = np.asarray(rows)
+        codes = self._codes[rows]
+        _, idx = np.unique(codes[codes >= 0], return_index=True)
+        return np.sort(rows[codes >= 0][idx])
+
+    def dedup(self):
+        """按公司去重后的视图（首次调用时构建并缓存）"""
+        if self._dedup is None:
+            self._dedup = self.df.iloc[self.first_positions()]
+        return self._dedup
+
+    def prefix(self, q, limit=20):
+        """名称前缀查找（有序数组二分）"""
+        lo = np.searchsorted(self._sorted_names, q, 'left')
+        hi = np.searchsorted(self._sorted_names, q + '\uffff', 'right')
+        return self._sorted_names[lo:min(hi, lo + limit)].tolist()
+
+    def search(self, q, limit=20):
+        """名称子串查找：倒排表求交得到候选，再逐个核对；前缀命中排在前面"""
+        q = q.strip()
+        if not q:
+            return []
+        grams = [q] if len(q) == 1 else [q[k:k + 2] for k in range(len(q) - 1)]
+        posting = [self._grams.get(g) for g in grams]
+        if any(p is None for p in posting):
+            return []
+        cand = functools.reduce(np.intersect1d, sorted(posting, key=len))
+        hits = [n for n in self.names[cand] if q in n]
+        hits.sort(key=lambda n: (not n.startswith(q), len(n), n))
+        return hits[:limit]
+
+    def lookup(self, names):
+        """企业明细：名称、所属产业（多个以顿号分隔）、区县、规模"""
+        rows = [self.positions(n)[0] for n in names]
+        out = self.df.iloc[rows][['公司名称', '区县', '企业划型名称']].copy()
+        out.insert(1, '所属产业', ['、'.join(self.clusters(n)) for n in names])
+        return out
+
+# --- 4. 产业交叉重叠 ---
+class ClusterOverlap:
+    """企业 × 产业 0/1 关联矩阵 M（稀疏 CSR，每家企业一行）。
+
+    M.T @ M 一次得到全部产业两两共有企业数（对角线为各产业企业数），
+    Jaccard = 共有 / (|A| + |B| - 共有)。计算量与非零元数量成正比，不做两两集合求交。
+    """
+
+    def __init__(self, df):
+        comp, self.companies = pd.factorize(df['公司名称'])
+        clus, uniques = pd.factorize(df['所属产业集群'], sort=True)
+        self.clusters = list(uniques)
+        valid = (comp >= 0) & (clus >= 0)
+        shape = (len(self.companies), len(self.clusters))
+        if HAS_SCIPY:
+            m = sp.csr_matrix((np.ones(int(valid.sum()), dtype=np.int32), (comp[valid], clus[valid])), shape=shape)
+            m.sum_duplicates()
+            m.data[:] = 1  # 同一企业在同一产业重复出现时只计一次
+            self.matrix = m
+            co = (m.T @ m).toarray()
+        else:
+            m = np.zeros(shape, dtype=np.int32)
+            m[comp[valid], clus[valid]] = 1
+            self.matrix = m
+            co = m.T @ m
+        self.counts = pd.DataFrame(co, index=self.clusters, columns=self.clusters)
+        size = np.diag(co)
+        union = size[:, None] + size[None, :] - co
+        self.jaccard = pd.DataFrame(np.divide(co, union, out=np.zeros(co.shape), where=union > 0),
+                                    index=self.clusters, columns=self.clusters)
+
+    def memberships(self):
+        """每家企业所属产业数的分布：{产业数: 企业数}"""
+        per = np.asarray(self.matrix.sum(axis=1)).ravel()
+        return pd.Series(np.bincount(per)[1:], index=pd.RangeIndex(1, per.max() + 1, name='所属产业数')) if len(per) else pd.Series(dtype=int)
+
+    def top_pairs(self, k=5, by='counts'):
+        """重叠最多的 k 对产业（不含自身）"""
+        mat = getattr(self, by).to_numpy()
+        i, j = np.triu_indices(len(self.clusters), k=1)
+        vals = mat[i, j]
+        top = np.argsort(vals)[::-1][:k]
+        return [(self.clusters[i[t]], self.clusters[j[t]], vals[t].item()) for t in top if vals[t] > 0]
+
+# --- 5. 综合得分排名 ---
+RANK_COLS = ['支撑得分', '护城河得分', '覆盖得分', '专利数量_f', '资质总量_f']
+RANK_GROUPS = ['所属产业集群', '区县', '企业划型名称']
+DEFAULT_WEIGHTS = {'支撑得分': 0.3, '护城河得分': 0.3, '覆盖得分': 0.2, '专利数量_f': 0.1, '资质总量_f': 0.1}
+
+class RankingEngine:
+    """加权综合得分 Top-K 排名。
+
+    各指标加载时缩放到 0-1（专利数 / 资质数长尾，先取 log1p），缺失记 0；综合得分 = 100 × Σ wᵢ·zᵢ / Σ wᵢ。
+    Top-K 用 argpartition 部分排序，按 (权重, 分组列) 一次性算出全部分组取值的榜单并 LRU 缓存；
+    权重变化时只对变化的指标列做增量更新（未归一化得分 += Z[:, Δ] @ Δw，返回时再除以 Σ w），不重算整个矩阵乘。
+    所属产业集群以外的分组只统计 unique_rows（按公司去重的行），避免同一企业重复上榜。
+    """
+
+    def __init__(self, df, unique_rows=None, cols=RANK_COLS, groups=RANK_GROUPS, cache_size=32):
+        self.df, self.cols = df, list(cols)
+        z = df[self.cols].to_numpy(dtype=float)
+        for j, c in enumerate(self.cols):
+            if c.endswith('_f'):
+                z[:, j] = np.log1p(np.clip(z[:, j], 0, None))
+            lo, hi = np.nanmin(z[:, j]), np.nanmax(z[:, j])
+            z[:, j] = (z[:, j] - lo) / (hi - lo) if hi > lo else 0.0
+        self.z = np.nan_to_num(z)
+        self._w = np.zeros(len(self.cols))
+        self._score = np.zeros(len(df))
+        self._lock = threading.Lock()  # 引擎在会话间共享，增量状态需互斥更新
+        self._groups = {}
+        for g in groups:
+            rows = np.arange(len(df)) if g == '所属产业集群' or unique_rows is None else np.asarray(unique_rows)
+            codes, uniques = pd.factorize(df[g].to_numpy()[rows], sort=True)
+            keep = codes >= 0
+            order = np.argsort(codes[keep], kind='stable')
+            ptr = np.r_[0, np.cumsum(np.bincount(codes[keep], minlength=len(uniques)))]
+            self._groups[g] = (list(uniques), rows[keep][order], ptr)
+        self._cache, self._cache_size = OrderedDict(), cache_size
+
+    def values(self, by):
+        return self._groups[by][0]
+
+    def weight_vector(self, weights):
+        """原始（未归一化）权重向量；只移动一个滑块时只有一个分量变化"""
+        w = np.array([float(weights.get(c, 0)) for c in self.cols])
+        if w.sum() <= 0:
+            raise ValueError("权重之和须大于 0")
+        return w
+
+    def scores(self, weights):
+        """全部行的综合得分（0-100）；与上次权重相比只更新变化的列"""
+        w = self.weight_vector(weights)
+        with self._lock:
+            delta = w - self._w
+            changed = np.flatnonzero(np.abs(delta) > 1e-12)
+            if len(changed) == len(self.cols):
+                self._score = self.z @ w
+            elif len(changed):
+                self._score = self._score + self.z[:, changed] @ delta[changed]
+            self._w = w
+            return self._score * (100 / w.sum())
+
+    @staticmethod
+    def _topk(rows, score, k):
+        s = score[rows]
+        if len(rows) > k:
+            idx = np.argpartition(-s, k - 1)[:k]
+        else:
+            idx = np.arange(len(rows))
+        return rows[idx[np.argsort(-s[idx], kind='stable')]]
+
+    def leaderboards(self, weights, by, k=20):
+        """按 by 分组的全部 Top-K 榜单 {分组取值: 行位置}（按权重缓存）"""
+        w = self.weight_vector(weights)
+        key = (tuple(np.round(w / w.sum(), 6)), by, k)  # 按比例相同的权重得分相同，共用一份榜单
+        with self._lock:
+            out = self._cache.get(key)
+            if out is not None:
+                self._cache.move_to_end(key)
+                return out
+        score = self.scores(weights)
+        uniques, rows, ptr = self._groups[by]
+        out = {v: self._topk(rows[ptr[i]:ptr[i + 1]], score, k) for i, v in enumerate(uniques)}
+        with self._lock:
+            self._cache[key] = out
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return out
+
+    def table(self, rows, weights):
+        """榜单明细表：名次、企业基本信息、综合得分与各指标"""
+        score = self.scores(weights)
+        out = self.df.iloc[rows][['公司名称', '所属产业集群', '区县', '企业划型名称', *self.cols]].copy()
+        out[self.cols] = out[self.cols].astype(float).round(1)
+        out.insert(0, '综合得分', np.round(score[rows], 1))
+        out.insert(0, '名次', np.arange(1, len(rows) + 1))
+        return out
+
+    def top(self, weights, by, value, k=20):
+        return self.table(self.leaderboards(weights, by, k).get(value, np.array([], dtype=int)), weights)
+
+    def top_within(self, weights, rows, k=20):
+        """任意行子集（如筛选结果）内的 Top-K，不走缓存"""
+        rows = np.arange(len(self.df))[rows] if isinstance(rows, slice) else np.asarray(rows)
+        return self.table(self._topk(rows, self.scores(weights), k), weights)
@@ -0,0 +1,281 @@
+"""企业报告库：Markdown / PDF 评估报告的元数据索引、全文检索与按需加载。
+
+- 元数据（企业、日期、页数）与逐页文本在首次建立索引时抽取，按文件 (大小, 修改时间) 缓存在
+  cache_dir 下，之后只处理新增或变化的报告；产业 / 区县按企业名称从企业索引补全；
+- 全文检索：逐页文本的单字 + 二元组倒排表（CSR 数组）求交得到候选页，再核对子串并给出摘要；
+- 按需加载：只读取选中的报告，PDF 只抽取选中的页码区间；渲染结果与检索用的归一化文本各放在一个按字节数限额的 LRU 中。
+
+PDF 解析依赖可选的 pypdf；未安装时 PDF 只按文件名建立索引，且只能整份查看。
+"""
+import os
+import io
+import sys
+import re
+import json
+import hashlib
+import functools
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from trace_utils import span, traced
+
+try:
+    import pypdf
+    HAS_PYPDF = True
+except ImportError:
+    HAS_PYPDF = False
+
+INDEX_NAME = "index.json"
+POSTINGS_NAME = "postings.npz"
+INDEX_VERSION = 1
+REPORT_EXTS = (".md", ".pdf")
+INDEX_COLS = ['id', '企业', '产业', '区县', '日期', '类型', '页数', '大小KB', '路径']
+TITLE_RE = re.compile(r"《(.+?)》")
+SPACE_RE = re.compile(r"\s+")
+
+Rendered = namedtuple('Rendered', 'kind body pages texts nbytes')
+
+def normalize(text):
+    """检索用文本：去空白（PDF 抽取的文本按版面折行）、英文转小写"""
+    return SPACE_RE.sub("", text).lower()
+
+def _grams(text):
+    return set(text) | {text[k:k + 2] for k in range(len(text) - 1)}
+
+def _file_fp(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+# --- 1. 文本与元数据抽取 ---
+def extract_report(path):
+    """抽取单份报告：(逐页文本, 标题, 日期)；Markdown 视为一页"""
+    mtime = datetime.fromtimestamp(os.path.getmtime(path)).strftime("%Y-%m-%d")
+    if path.endswith(".md"):
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        return [text], text, mtime
+    if not HAS_PYPDF:
+        return [], "", mtime
+    reader = pypdf.PdfReader(path)
+    pages = [p.extract_text() or "" for p in reader.pages]
+    created = reader.metadata and reader.metadata.creation_date
+    return pages, pages[0] if pages else "", created.strftime("%Y-%m-%d") if created else mtime
+
+def report_company(title, path):
+    """报告对应的企业名：优先取标题中的《…》，否则取去掉“评估报告”等后缀的文件名"""
+    m = TITLE_RE.search(title[:500])
+    if m:
+        return m.group(1).strip()
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return re.sub(r"(专项)?(审计|评估)?报告$", "", stem) or stem
+
+# --- 2. 报告库 ---
+class ReportLibrary:
+    """报告目录的索引视图：index 为元数据表，search() 为全文检索，render() 按需加载单份报告"""
+
+    def __init__(self, sources, cache_dir, companies=None, max_bytes=64 * 2**20, text_bytes=32 * 2**20):
+        self.sources, self.cache_dir, self.max_bytes, self.text_bytes = sources, cache_dir, max_bytes, text_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._items, self._size = OrderedDict(), 0
+        self._texts, self._text_size = OrderedDict(), 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        self.build(companies)
+
+    def files(self):
+        """sources 中的报告文件：目录取其中的 .md / .pdf（忽略 ~$ 临时文件），文件原样保留"""
+        out = []
+        for src in self.sources:
+            if os.path.isdir(src):
+                out += [os.path.join(src, f) for f in sorted(os.listdir(src))
+                        if f.endswith(REPORT_EXTS) and not f.startswith("~$")]
+            elif os.path.exists(src):
+                out.append(src)
+        return out
+
+    def _text_path(self, rid):
+        return os.path.join(self.cache_dir, hashlib.sha1(rid.encode()).hexdigest() + ".json")
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.cache_dir, INDEX_NAME), "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        ok = index.get("version") == INDEX_VERSION and index.get("pypdf") == HAS_PYPDF
+        return index.get("reports", {}) if ok else {}
+
+    @traced()
+    def build(self, companies=None):
+        """建立元数据表与倒排表；只有新增或变化的报告需要重新抽取文本，报告集合未变时直接载入倒排表"""
+        old, entries = self._read_index(), {}
+        for path in self.files():
+            rid, fp = os.path.basename(path), _file_fp(path)
+            if rid in entries:  # 不同来源目录下的同名报告
+                rid = os.path.join(os.path.basename(os.path.dirname(path)), rid)
+            e = old.get(rid)
+            if not (e and e["fp"] == fp and e["path"] == path and os.path.exists(self._text_path(rid))):
+                with span("extract_report", "report_utils", file=rid):
+                    pages, title, date = extract_report(path)
+                e = {"path": path, "fp": fp, "company": report_company(title, path), "date": date,
+                     "kind": path.rsplit(".", 1)[-1], "pages": len(pages) or None}
+                with open(self._text_path(rid), "w", encoding="utf-8") as f:
+                    json.dump(pages, f, ensure_ascii=False)
+            entries[rid] = e
+        with open(os.path.join(self.cache_dir, INDEX_NAME), "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "pypdf": HAS_PYPDF, "reports": entries}, f, ensure_ascii=False, indent=1)
+        self.entries = entries
+        self.index = self._metadata(entries, companies)
+        self._ids, self._companies = self.index['id'].tolist(), self.index['企业'].tolist()
+        with self._lock:
+            self._texts.clear()
+            self._text_size = 0
+        self._load_postings(hashlib.sha1(json.dumps(entries, sort_keys=True).encode()).hexdigest())
+
+    def _metadata(self, entries, companies):
+        rows = []
+        for rid, e in entries.items():
+            name, clusters, district = e["company"], "", ""
+            if companies is not None:
+                # 报告标题常用全称，文件名常用简称：精确匹配不到时取名称检索的首个结果
+                hits = [name] if name in companies else companies.search(name, limit=1)
+                if hits:
+                    name = hits[0]
+                    clusters = "、".join(companies.clusters(name))
+                    district = str(companies.df['区县'].iloc[companies.positions(name)[0]])
+            rows.append({'id': rid, '企业': name, '产业': clusters, '区县': district, '日期': e["date"],
+                         '类型': e["kind"].upper(), '页数': e["pages"], '大小KB': round(e["fp"][0] / 1024, 1),
+                         '路径': e["path"]})
+        return pd.DataFrame(rows, columns=INDEX_COLS)
+
+    def _load_postings(self, signature):
+        """(gram → 页) 倒排表：全部页面顺序编号，self._page_ref[i] = (报告序号, 页码)。
+
+        以报告集合的签名缓存为 npz；签名一致时不再读取任何报告文本。
+        """
+        path = os.path.join(self.cache_dir, POSTINGS_NAME)
+        try:
+            with np.load(path) as z:
+                if str(z["signature"]) == signature:
+                    self._vocab = {g: i for i, g in enumerate(z["vocab"].tolist())}
+                    self._post, self._ptr, self._page_ref = z["post"], z["ptr"], z["page_ref"]
+                    return
+        except (OSError, KeyError, ValueError):
+            pass
+        with span("build_postings", "report_utils", reports=len(self._ids)):
+            vocab, gram_ids, page_ids, ref = {}, [], [], []
+            for r, rid in enumerate(self._ids):
+                for p, text in enumerate(self._norm_pages(rid)):
+                    ids = [vocab.setdefault(g, len(vocab)) for g in _grams(text)]
+                    gram_ids.append(np.array(ids, np.int32))
+                    page_ids.append(np.full(len(ids), len(ref), np.int32))
+                    ref.append((r, p))
+            g = np.concatenate(gram_ids) if gram_ids else np.zeros(0, np.int32)
+            order = np.argsort(g, kind='stable')
+            self._vocab = vocab
+            self._post = np.concatenate(page_ids)[order] if page_ids else np.zeros(0, np.int32)
+            self._ptr = np.r_[0, np.cumsum(np.bincount(g, minlength=len(vocab)))]
+            self._page_ref = np.array(ref, np.int32).reshape(-1, 2)
+        np.savez(path, signature=signature, vocab=np.array(list(vocab), dtype=str), post=self._post,
+                 ptr=self._ptr, page_ref=self._page_ref)
+
+    def _page_text(self, rid):
+        with open(self._text_path(rid), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _norm_pages(self, rid):
+        """检索用的归一化逐页文本；按字节数限额的 LRU（每份约数 KB，容量须容纳一次检索的全部候选报告，否则反复读盘）"""
+        with self._lock:
+            item = self._texts.get(rid)
+            if item is not None:
+                self._texts.move_to_end(rid)
+                return item[0]
+        pages = [normalize(t) for t in self._page_text(rid)]
+        size = sum(map(sys.getsizeof, pages))
+        with self._lock:
+            if rid not in self._texts:
+                self._texts[rid] = pages, size
+                self._text_size += size
+                while self._text_size > self.text_bytes and len(self._texts) > 1:
+                    _, (_, old) = self._texts.popitem(last=False)
+                    self._text_size -= old
+        return pages
+
+    def __len__(self):
+        return len(self.index)
+
+    # 全文检索
+    def search(self, q, limit=50, context=30):
+        """全文检索：返回 (id, 企业, 页码, 命中次数, 摘要)，按命中次数降序"""
+        cols = ['id', '企业', '页码', '命中次数', '摘要']
+        qn = normalize(q)
+        if not qn:
+            return pd.DataFrame(columns=cols)
+        grams = [qn] if len(qn) == 1 else [qn[k:k + 2] for k in range(len(qn) - 1)]
+        ids = [self._vocab.get(g) for g in grams]
+        if any(i is None for i in ids):
+            return pd.DataFrame(columns=cols)
+        posting = sorted((self._post[self._ptr[i]:self._ptr[i + 1]] for i in ids), key=len)
+        cand = functools.reduce(np.intersect1d, posting)
+        rows = []
+        for r, p in self._page_ref[cand].tolist():
+            text = self._norm_pages(self._ids[r])[p]
+            n = text.count(qn)
+            if n:
+                k = text.find(qn)
+                snippet = ("…" if k > context else "") + text[max(0, k - context):k + len(qn) + context] + "…"
+                rows.append({'id': self._ids[r], '企业': self._companies[r], '页码': p + 1, '命中次数': n, '摘要': snippet})
+        out = pd.DataFrame(rows, columns=cols)
+        return out.sort_values('命中次数', ascending=False, kind='stable').head(limit).reset_index(drop=True)
+
+    # 按需加载
+    def render(self, rid, pages=None):
+        """加载单份报告；pages=(起, 止)（含，从 1 开始）只取 PDF 的该页码区间。结果进入 LRU"""
+        e = self.entries[rid]
+        key = (rid, tuple(e["fp"]), tuple(pages) if pages else None)
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item
+        self.misses += 1
+        with span("render_report", "report_utils", file=rid, pages=str(pages)):
+            item = self._render(e, rid, pages)
+        with self._lock:
+            if key not in self._items:
+                self._items[key] = item
+                self._size += item.nbytes
+                while self._size > self.max_bytes and len(self._items) > 1:
+                    _, old = self._items.popitem(last=False)
+                    self._size -= old.nbytes
+        return item
+
+    def _render(self, e, rid, pages):
+        path = e["path"]
+        if e["kind"] == "md":
+            with open(path, "r", encoding="utf-8") as f:
+                body = f.read()
+            return Rendered("md", body, None, [body], len(body.encode()))
+        n = e["pages"]
+        if not (HAS_PYPDF and n):
+            with open(path, "rb") as f:
+                body = f.read()
+            return Rendered("pdf", body, None, [], len(body))
+        lo, hi = pages or (1, n)
+        lo, hi = max(1, lo), min(n, hi)
+        reader, writer = pypdf.PdfReader(path), pypdf.PdfWriter()
+        for i in range(lo - 1, hi):
+            writer.add_page(reader.pages[i])
+        buf = io.BytesIO()
+        writer.write(buf)
+        body = buf.getvalue()
+        texts = self._page_text(rid)[lo - 1:hi]
+        return Rendered("pdf", body, (lo, hi), texts, len(body) + sum(len(t.encode()) for t in texts))
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
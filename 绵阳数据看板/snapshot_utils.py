@@ -0,0 +1,298 @@
+"""数据版本快照：每期导出的产业工作簿以列式 (Parquet) 快照保存，后续版本只存相对上一版本的增量。
+
+用法：
+    python snapshot_utils.py ingest data --ref-date 2024-12-31            # 以数据目录创建快照
+    python snapshot_utils.py ingest data_2025Q1 --ref-date 2025-03-31 --id 2025Q1
+    python snapshot_utils.py list
+    python snapshot_utils.py diff 20241231 2025Q1 --out diff.xlsx
+
+快照以 (公司名称, 所属产业集群) 为键；企业年限 / 年限梯队不入库，读取时按各快照的参考日期重算，
+参考日期变化不会让每一行都变成“修改”。目录下的 catalog.json 记录各快照的元数据与按产业汇总的
+指标，跨版本趋势只读目录即可；差异对比只从 Parquet 读取键列与被比较的列。
+"""
+import os
+import json
+import argparse
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import data_utils as du
+from trace_utils import span, traced
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_DIR = os.path.join(BASE_DIR, "snapshots")
+CATALOG_NAME = "catalog.json"
+CATALOG_VERSION = 1
+KEYS = ['公司名称', '所属产业集群']
+DUP_COL = '重名序号'  # 同一产业内重名企业的出现序号，使 KEYS + DUP_COL 唯一
+ROW_KEYS = [*KEYS, DUP_COL]
+DERIVED_COLS = ['企业年限', '年限梯队']
+DIFF_COLS = [*du.SCORE_COLS, du.RISK_MASK_COL, '注册资本_f']
+TREND_METRICS = ['企业数量', *du.SCORE_COLS, '风险企业占比', '平均注册资本', '平均企业年限']
+REBASE_EVERY = 4  # 增量链达到该长度后写入完整快照，控制读取时需要回放的增量数
+
+SnapshotDiff = namedtuple('SnapshotDiff', 'added removed changed')
+
+# --- 1. 行键与行哈希 ---
+def _prepare(df_all):
+    """入库前整理：紧凑布局、去掉按参考日期派生的列、补充重名序号"""
+    df = df_all if du.RISK_MASK_COL in df_all.columns else du.compact_frame(df_all, "snapshot")
+    df = df.drop(columns=[c for c in DERIVED_COLS if c in df.columns])
+    df[DUP_COL] = df.groupby(KEYS, observed=True, sort=False).cumcount().astype(np.int32)
+    return df
+
+def _key_index(df):
+    return pd.MultiIndex.from_arrays([df[c].astype(str).to_numpy() if c != DUP_COL else df[c].to_numpy()
+                                      for c in ROW_KEYS])
+
+def _row_hash(df, cols):
+    """逐行内容哈希；对象列统一按字符串哈希（Parquet 往返后 None / NaN、object / str 类型可能互换）"""
+    parts = {}
+    for c in cols:
+        s = df[c]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            s = s.astype(str)
+        elif s.dtype == object or pd.api.types.is_string_dtype(s):
+            s = s.astype(object).where(s.notna(), None).astype(str)
+        parts[c] = s
+    return pd.util.hash_pandas_object(pd.DataFrame(parts), index=False).to_numpy()
+
+# --- 2. 快照库 ---
+class SnapshotStore:
+    """按版本保存产业数据的快照库（首个版本及每 REBASE_EVERY 个版本存完整快照，其余存增量）"""
+
+    def __init__(self, root=SNAPSHOT_DIR, rebase_every=REBASE_EVERY, memo_size=8):
+        self.root, self.rebase_every, self.memo_size = root, rebase_every, memo_size
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # 快照库在会话间共享：保存快照与改写目录须互斥
+        self.entries = self._read_catalog()
+
+    # 目录
+    def _read_catalog(self):
+        try:
+            with open(os.path.join(self.root, CATALOG_NAME), "r", encoding="utf-8") as f:
+                catalog = json.load(f)
+        except (OSError, ValueError):
+            return []
+        return catalog.get("snapshots", []) if catalog.get("version") == CATALOG_VERSION else []
+
+    def _write_catalog(self):
+        path = os.path.join(self.root, CATALOG_NAME)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"version": CATALOG_VERSION, "snapshots": self.entries}, f, ensure_ascii=False, indent=1)
+        os.replace(path + ".tmp", path)
+
+    def ids(self):
+        return [e["id"] for e in self.entries]
+
+    def entry(self, snap_id):
+        for e in self.entries:
+            if e["id"] == snap_id:
+                return e
+        raise KeyError(f"快照不存在：{snap_id}")
+
+    def catalog(self):
+        """快照一览（不含汇总明细）"""
+        cols = ['id', 'ref_date', 'kind', 'parent', 'rows', 'added', 'removed', 'changed', 'created', 'note']
+        return pd.DataFrame([{c: e.get(c) for c in cols} for e in self.entries], columns=cols)
+
+    def _path(self, snap_id, part):
+        return os.path.join(self.root, f"{snap_id}.{part}.parquet")
+
+    def _chain(self, snap_id):
+        """从最近的完整快照到 snap_id 的回放链"""
+        chain = [self.entry(snap_id)]
+        while chain[-1]["kind"] != "base":
+            chain.append(self.entry(chain[-1]["parent"]))
+        return chain[::-1]
+
+    # 读取
+    def load(self, snap_id, columns=None):
+        """还原快照；columns 指定时只从 Parquet 读取这些列（行键列总会读取）。
+
+        请求 企业年限 / 年限梯队（或 columns=None）时按该快照的参考日期重算。
+        """
+        entry = self.entry(snap_id)
+        derive = columns is None or any(c in DERIVED_COLS for c in columns)
+        read = None
+        if columns is not None:
+            read = list(dict.fromkeys([*ROW_KEYS, *(c for c in columns if c not in DERIVED_COLS),
+                                       *(['成立日期'] if derive else [])]))
+        with span("load_snapshot", "snapshot_utils", id=snap_id, columns=len(read) if read else "all"):
+            df = None
+            for e in self._chain(snap_id):
+                if e["kind"] == "base":
+                    df = pd.read_parquet(self._path(e["id"], "base"), columns=read)
+                    continue
+                upserts = pd.read_parquet(self._path(e["id"], "upserts"), columns=read)
+                removed = pd.read_parquet(self._path(e["id"], "removed"))
+                drop = _key_index(removed).append(_key_index(upserts))
+                df = pd.concat([df[~_key_index(df).isin(drop)], upserts], ignore_index=True)
+            for c in du.CATEGORY_COLS:
+                if c in df.columns: df[c] = df[c].astype('category')
+            # 增量追加的行排回所属产业，保持 “同一产业行相邻” 的约定（见 cluster_slices）
+            df = df.sort_values('所属产业集群', kind='stable', ignore_index=True)
+            if derive and '成立日期' in df.columns:
+                du.add_age_columns(df, entry["ref_date"])
+                df['企业年限'] = df['企业年限'].astype(np.float32)
+                df['年限梯队'] = df['年限梯队'].astype('category')
+        return df
+
+    # 写入
+    @traced()
+    def create(self, df_all, ref_date, snap_id=None, note=""):
+        """保存新快照（作为当前最新快照的后继），返回快照编号；快照目录在首次保存时创建"""
+        with self._write_lock:
+            os.makedirs(self.root, exist_ok=True)
+            return self._create(df_all, ref_date, snap_id, note)
+
+    def _create(self, df_all, ref_date, snap_id, note):
+        ref = pd.Timestamp(ref_date).strftime("%Y-%m-%d")
+        snap_id = snap_id or ref.replace("-", "")
+        if snap_id in self.ids():
+            raise ValueError(f"快照编号已存在：{snap_id}")
+        df = _prepare(df_all)
+        parent = self.entries[-1] if self.entries else None
+        # 列结构变化（如导出模板增删字段）时无法按行比较，改存完整快照
+        kind = "base"
+        if parent is not None and len(self._chain(parent["id"])) < self.rebase_every and set(parent["columns"]) == set(df.columns):
+            kind = "delta"
+            old = self.load(parent["id"], columns=list(df.columns))
+        with span("write_snapshot", "snapshot_utils", id=snap_id, kind=kind):
+            stats = {"rows": len(df), "added": len(df), "removed": 0, "changed": 0}
+            if kind == "base":
+                df.to_parquet(self._path(snap_id, "base"), index=False)
+            else:
+                cols = [c for c in df.columns if c not in ROW_KEYS]
+                new_idx, old_idx = _key_index(df), _key_index(old)
+                common = new_idx.isin(old_idx)
+                old_hash = pd.Series(_row_hash(old, cols), index=old_idx)
+                changed = np.zeros(len(df), bool)
+                changed[common] = old_hash.reindex(new_idx[common]).to_numpy() != _row_hash(df[common], cols)
+                gone = ~old_idx.isin(new_idx)
+                df[~common | changed].to_parquet(self._path(snap_id, "upserts"), index=False)
+                old.loc[gone, ROW_KEYS].to_parquet(self._path(snap_id, "removed"), index=False)
+                stats.update(added=int((~common).sum()), removed=int(gone.sum()), changed=int(changed.sum()))
+        du.add_age_columns(df, ref)
+        self.entries.append({
+            "id": snap_id, "ref_date": ref, "kind": kind, "parent": parent and parent["id"],
+            "created": datetime.now().isoformat(timespec="seconds"), "note": note, **stats,
+            "columns": [c for c in df.columns if c not in DERIVED_COLS],
+            "summary": snapshot_summary(df).to_dict("records"),
+        })
+        self._write_catalog()
+        return snap_id
+
+    @traced()
+    def ingest(self, data_dir, ref_date, snap_id=None, note="", workers=None):
+        """解析一个数据目录（某期导出）并保存为快照"""
+        df_all, _ = du.load_all_data(data_dir, workers=workers, compact=True)
+        return self.create(df_all, ref_date, snap_id, note or os.path.abspath(data_dir))
+
+    # 对比与趋势
+    def diff(self, a, b, cols=DIFF_COLS):
+        """快照 a → b 的企业级差异（同一产业内重名企业只比较首条记录），结果按参数缓存"""
+        key = (a, b, tuple(cols))
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                return self._memo[key]
+        with span("snapshot_diff", "snapshot_utils", a=a, b=b):
+            result = diff_frames(self.load(a, [*KEYS, *cols]), self.load(b, [*KEYS, *cols]), cols)
+        with self._lock:
+            self._memo[key] = result
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return result
+
+    def trends(self):
+        """各快照按产业汇总的指标（长表），仅读取目录，不载入快照数据"""
+        recs = [{"快照": e["id"], "参考日期": e["ref_date"], **r} for e in self.entries for r in e["summary"]]
+        return pd.DataFrame(recs, columns=['快照', '参考日期', '所属产业集群', *TREND_METRICS])
+
+def snapshot_summary(df):
+    """按产业（及全市）汇总的趋势指标"""
+    work = pd.DataFrame({
+        '所属产业集群': df['所属产业集群'].astype(str), '公司名称': df['公司名称'],
+        **{c: df[c].astype(float) for c in du.SCORE_COLS},
+        '风险': (df[du.RISK_MASK_COL] > 0).astype(float), '注册资本_f': df['注册资本_f'].astype(float),
+        '企业年限': df['企业年限'].astype(float),
+    })
+    def agg(g):
+        return g.agg(企业数量=('公司名称', 'nunique'), **{c: (c, 'mean') for c in du.SCORE_COLS},
+                     风险企业占比=('风险', 'mean'), 平均注册资本=('注册资本_f', 'mean'), 平均企业年限=('企业年限', 'mean'))
+    out = pd.concat([agg(work.groupby('所属产业集群')).reset_index(),
+                     agg(work.groupby(lambda _: '全市')).reset_index(names='所属产业集群')], ignore_index=True)
+    return out.round(4).astype(object).where(out.notna(), None)
+
+# --- 3. 向量化差异 ---
+def _risk_change(old, new):
+    """风险位图的变化说明，如 “+经营异常 -股权出质”"""
+    gained, lost = new & ~old, old & ~new
+    text = np.full(len(old), "", dtype=object)
+    for i, name in enumerate(du.RISK_COLS):
+        text = text + np.where(gained >> i & 1, f"+{name} ", "") + np.where(lost >> i & 1, f"-{name} ", "")
+    return [t.strip() for t in text]
+
+def diff_frames(old, new, cols=DIFF_COLS):
+    """两个版本的企业级差异：新增 / 移除 / 指定列发生变化的企业（外连接 + 按列向量比较）"""
+    def first(df):
+        df = df[df[DUP_COL] == 0] if DUP_COL in df.columns else df.drop_duplicates(KEYS)
+        return df.assign(**{k: df[k].astype(str) for k in KEYS})[[*KEYS, *cols]]
+
+    m = first(old).merge(first(new), on=KEYS, how='outer', suffixes=('_旧', '_新'), indicator=True)
+    added = m.loc[m['_merge'] == 'right_only', [*KEYS, *(f"{c}_新" for c in cols)]]
+    removed = m.loc[m['_merge'] == 'left_only', [*KEYS, *(f"{c}_旧" for c in cols)]]
+    both = m[m['_merge'] == 'both']
+    flags = pd.DataFrame({c: ~((both[f"{c}_旧"] == both[f"{c}_新"]) | (both[f"{c}_旧"].isna() & both[f"{c}_新"].isna()))
+                          for c in cols})
+    changed = both[flags.any(axis=1)].copy()
+    flags = flags[flags.any(axis=1)]
+    names = np.array(cols, dtype=object)
+    changed.insert(len(KEYS), '变化字段', [", ".join(names[row]) for row in flags.to_numpy()])
+    for c in cols:
+        if c == du.RISK_MASK_COL:
+            changed['风险变化'] = _risk_change(*(changed[f"{c}_{v}"].fillna(0).to_numpy(np.uint8) for v in ('旧', '新')))
+        else:
+            changed[f"{c}_差值"] = changed[f"{c}_新"].astype(float) - changed[f"{c}_旧"].astype(float)
+    return SnapshotDiff(*(d.drop(columns='_merge', errors='ignore').reset_index(drop=True) for d in (added, removed, changed)))
+
+# --- 4. 命令行 ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="产业数据版本快照：保存、列出与对比")
+    parser.add_argument("--root", default=SNAPSHOT_DIR, help="快照库目录")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("ingest", help="解析数据目录并保存为新快照")
+    p.add_argument("data_dir")
+    p.add_argument("--ref-date", required=True, help="数据截止日期（企业年限按此计算），如 2024-12-31")
+    p.add_argument("--id", help="快照编号（默认取截止日期 YYYYMMDD）")
+    p.add_argument("--note", default="")
+    p.add_argument("--workers", type=int)
+    sub.add_parser("list", help="列出已有快照")
+    p = sub.add_parser("diff", help="对比两个快照")
+    p.add_argument("a")
+    p.add_argument("b")
+    p.add_argument("--out", help="将差异写入 Excel（新增 / 移除 / 变化 三个工作表）")
+    args = parser.parse_args(argv)
+
+    store = SnapshotStore(args.root)
+    if args.cmd == "ingest":
+        snap_id = store.ingest(args.data_dir, args.ref_date, args.id, args.note, args.workers)
+        e = store.entry(snap_id)
+        print(f"✅ 快照 {snap_id}（{e['kind']}）：{e['rows']} 行，新增 {e['added']} / 移除 {e['removed']} / 变化 {e['changed']}")
+    elif args.cmd == "list":
+        print(store.catalog().to_string(index=False))
+    else:
+        d = store.diff(args.a, args.b)
+        print(f"{args.a} → {args.b}：新增 {len(d.added)} / 移除 {len(d.removed)} / 变化 {len(d.changed)} 家企业")
+        if args.out:
+            with pd.ExcelWriter(args.out) as w:
+                for sheet, frame in zip(["新增", "移除", "变化"], d):
+                    frame.to_excel(w, sheet_name=sheet, index=False)
+            print(f"已写入 {args.out}")
+
+if __name__ == "__main__":
+    main()
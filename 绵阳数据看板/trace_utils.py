@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import threading
+import functools
+import contextvars
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+import pandas as pd
+
+# --- 1. 调用链追踪 ---
+class Tracer:
+    """轻量级调用链追踪：记录每个 span 的墙钟耗时与（可选）内存峰值。
+
+    span 按 (会话, 脚本重跑) 分组：begin_rerun 把二者写入上下文变量，span 开始时读取，
+    多个会话同时重跑互不串号；渲染线程经 contextvars.copy_context() 继承提交方的编号。
+    可导出为 JSON 或 Chrome Trace（chrome://tracing / Perfetto）。
+    内存峰值依赖 tracemalloc，开销明显且为进程级状态（多会话并发时峰值为近似值），
+    只在启动时由 TRACE_MEMORY=1 开启，不提供会话级开关。
+    """
+
+    def __init__(self, max_spans=20000):
+        self.spans = deque(maxlen=max_spans)
+        self.rerun = 0  # 进程内已分配的最大重跑编号
+        self._current = contextvars.ContextVar("trace_rerun", default=(None, 0))
+        self._origin = time.perf_counter()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    # 内存追踪开关
+    @property
+    def memory(self):
+        return tracemalloc.is_tracing()
+
+    def enable_memory(self, on=True):
+        if on and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not on and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def begin_rerun(self, session=None):
+        """标记 session 的一次新脚本重跑（编号进程内唯一），之后本线程 / 上下文中的 span 归入该次重跑"""
+        with self._lock:
+            self.rerun += 1
+            rerun = self.rerun
+        self._current.set((session, rerun))
+        return rerun
+
+    @property
+    def current(self):
+        """当前上下文的 (会话, 重跑编号)"""
+        return self._current.get()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def span(self, name, cat="app", **args):
+        session, rerun = self._current.get()
+        stack = self._stack()
+        frame = {"peak": 0}
+        mem = self.memory
+        if mem:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        stack.append(frame)
+        t0 = time.perf_counter()
+        try:
+            yield args
+        finally:
+            dur = time.perf_counter() - t0
+            stack.pop()
+            peak_kb = None
+            if mem and tracemalloc.is_tracing():
+                # reset_peak 会抹掉外层已达到的峰值，子 span 结束时把峰值回传给父 span
+                peak = max(tracemalloc.get_traced_memory()[1], frame["peak"])
+                if stack:
+                    stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+                peak_kb = round((peak - base) / 1024, 1)
+            self.spans.append({
+                "name": name, "cat": cat, "session": session, "rerun": rerun, "depth": len(stack),
+                "start": t0 - self._origin, "dur": dur, "peak_kb": peak_kb,
+                "pid": os.getpid(), "tid": threading.get_ident(), "args": args,
+            })
+
+    def traced(self, name=None, cat=None):
+        """装饰器版 span；默认以函数限定名命名、以模块名分类"""
+        def deco(func):
+            label, group = name or func.__qualname__, cat or func.__module__
+            @functools.wraps(func)
+            def wrapper(*a, **kw):
+                with self.span(label, group):
+                    return func(*a, **kw)
+            return wrapper
+        return deco
+
+    def clear(self):
+        self.spans.clear()
+
+    # --- 2. 汇总与导出 ---
+    def records(self, rerun=None, session=None):
+        """span 记录；rerun / session 给定时只取该次重跑 / 该会话的记录"""
+        return [s for s in list(self.spans)
+                if (rerun is None or s["rerun"] == rerun) and (session is None or s["session"] == session)]
+
+    def summary(self, rerun=None, session=None):
+        """按 (模块, span) 汇总：次数、总耗时、平均 / 最大耗时 (ms)、最大内存峰值 (KB)"""
+        cols = ['模块', '环节', '次数', '总耗时ms', '平均ms', '最大ms', '峰值KB']
+        recs = self.records(rerun, session)
+        if not recs:
+            return pd.DataFrame(columns=cols)
+        df = pd.DataFrame(recs)
+        df['ms'] = df['dur'] * 1000
+        g = df.groupby(['cat', 'name'])
+        out = pd.DataFrame({'次数': g.size(), '总耗时ms': g['ms'].sum(), '平均ms': g['ms'].mean(),
+                            '最大ms': g['ms'].max(), '峰值KB': g['peak_kb'].max()})
+        out = out.reset_index().rename(columns={'cat': '模块', 'name': '环节'})
+        return out.sort_values('总耗时ms', ascending=False).round(1)[cols]
+
+    def to_json(self, rerun=None, session=None):
+        return json.dumps(self.records(rerun, session), ensure_ascii=False, indent=1)
+
+    def to_chrome_trace(self, rerun=None, session=None):
+        """Chrome Trace Event 格式（完整事件 ph=X，时间单位 μs）"""
+        events = [{
+            "name": s["name"], "cat": s["cat"], "ph": "X", "pid": s["pid"], "tid": s["tid"],
+            "ts": round(s["start"] * 1e6, 1), "dur": round(s["dur"] * 1e6, 1),
+            "args": {**{k: str(v) for k, v in s["args"].items()}, "rerun": s["rerun"], "peak_kb": s["peak_kb"]},
+        } for s in self.records(rerun, session)]
+        return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, ensure_ascii=False)
+
+# 进程级默认追踪器；TRACE_MEMORY=1 时启动即记录内存峰值
+tracer = Tracer()
+if os.environ.get("TRACE_MEMORY") == "1":
+    tracer.enable_memory()
+
+span = tracer.span
+traced = tracer.traced
@@ -1,24 +1,64 @@
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm
-import seaborn as sns
 import numpy as np
 import pandas as pd
 import os
+import io
+import hashlib
+import functools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from contextlib import contextmanager
+from data_utils import RISK_COLS, risk_matrix, frame_fingerprint, linear_fit, hist_kde, violin_stats, trend_band, capital_counts
+from trace_utils import span
 
-# --- 1. 字体与路径初始化 ---
+# --- 1. 字体与路径初始化（延迟到首次绘图） ---
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 # 确保 GitHub 仓库中存在 fonts/simhei.ttf
 FONT_PATH = os.path.join(CURRENT_DIR, "fonts", "simhei.ttf")
 
-if os.path.exists(FONT_PATH):
-    my_font = fm.FontProperties(fname=FONT_PATH)
-else:
-    my_font = None
-    print("⚠️ 警告：未找到字体文件，请确认 fonts/simhei.ttf 已上传！")
+# matplotlib / seaborn 导入约 1.5 秒，只看报告页时不必付出这笔开销
+plt = sns = fm = my_font = None
+Figure = FigureCanvasAgg = None
+_init_lock = threading.Lock()
 
-# 基础风格
-sns.set_theme(style="whitegrid", font_scale=1.1)
-plt.rcParams['axes.unicode_minus'] = False 
+def init_plotting():
+    """导入 matplotlib / seaborn 并设置字体与基础风格；重复调用无开销"""
+    global plt, sns, fm, my_font, Figure, FigureCanvasAgg
+    if plt is not None:
+        return
+    with _init_lock, span("init_plotting", "visual_utils"):
+        if plt is not None:
+            return
+        import matplotlib.pyplot as _plt
+        import matplotlib.font_manager as fm
+        import seaborn as sns
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        if os.path.exists(FONT_PATH):
+            my_font = fm.FontProperties(fname=FONT_PATH)
+        else:
+            my_font = None
+            print("⚠️ 警告：未找到字体文件，请确认 fonts/simhei.ttf 已上传！")
+
+        # 基础风格
+        sns.set_theme(style="whitegrid", font_scale=1.1)
+        _plt.rcParams['axes.unicode_minus'] = False
+        plt = _plt
+
+def plotter(func):
+    """plot_* 装饰器：调用前确保绘图环境已初始化；传入的数据表多为各会话共享的只读对象，绘图后校验其列未被增删"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        init_plotting()
+        frames = [(a, tuple(a.columns)) for a in (*args, *kwargs.values()) if isinstance(a, pd.DataFrame)]
+        fig = func(*args, **kwargs)
+        for df, cols in frames:
+            if tuple(df.columns) != cols:
+                raise RuntimeError(f"{func.__name__} 改写了传入的数据表（列 {cols} → {tuple(df.columns)}）")
+        return fig
+    return wrapper
 
 # --- 2. 核心辅助函数：解决全图乱码 ---
 def set_ax_font(ax, title="", xlabel="", ylabel=""):
@@ -29,13 +69,31 @@ def set_ax_font(ax, title="", xlabel="", ylabel=""):
     for tick in ax.get_xticklabels(): tick.set_fontproperties(my_font)
     for tick in ax.get_yticklabels(): tick.set_fontproperties(my_font)
     if ax.get_legend():
-        plt.setp(ax.get_legend().get_texts(), fontproperties=my_font)
+        for text in ax.get_legend().get_texts(): text.set_fontproperties(my_font)
+
+def new_figure(nrows=1, ncols=1, figsize=None, **kwargs):
+    """面向对象 Agg 画布：不登记到 pyplot 全局状态，可在多个线程中并发绘制"""
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig, fig.subplots(nrows, ncols, **kwargs)
+
+def draw_fit(ax, fit, color, ls='-'):
+    """绘制回归直线与置信带（替代 sns.regplot 的自助法重采样）"""
+    if fit is None: return
+    ax.plot(fit.x, fit.y, color=color, ls=ls)
+    if fit.lo is not None: ax.fill_between(fit.x, fit.lo, fit.hi, color=color, alpha=0.15, lw=0)
+
+def draw_hist_kde(ax, h, color):
+    """由预计算的 HistKDE 绘制直方图与核密度曲线（替代 sns.histplot(kde=True) 逐行重算）"""
+    ax.bar(h.edges[:-1], h.counts, width=np.diff(h.edges), align='edge', color=color, alpha=0.5, edgecolor='white')
+    if h.curve is not None: ax.plot(h.grid, h.curve, color=color, lw=2)
 
 # --- 3. 绘图函数全集合 ---
 
 # 1.1 产业规模排行
+@plotter
 def plot_mianyang_ranking(df_metrics, col, title):
-    fig, ax = plt.subplots(figsize=(12, 7))
+    fig, ax = new_figure(figsize=(12, 7))
     pal = {"重点产业": "#d62728", "其他产业": "#1f77b4"}
     sorted_df = df_metrics.sort_values(col, ascending=False)
     sns.barplot(data=sorted_df, x=col, y="产业名称", hue="分类", dodge=False, ax=ax, palette=pal)
@@ -43,115 +101,332 @@ def plot_mianyang_ranking(df_metrics, col, title):
     return fig
 
 # 1.2 重点产业区县分布
-def plot_special_geo_stacked(df_all_raw, special_list):
-    df_spec = df_all_raw[df_all_raw['所属产业集群'].isin(special_list)].copy()
-    geo_spec = df_spec.groupby(['区县', '所属产业集群']).size().unstack().fillna(0)
-    fig, ax = plt.subplots(figsize=(12, 7))
-    geo_spec.plot(kind='bar', stacked=True, ax=ax, colormap='tab10')
+@plotter
+def plot_special_geo_stacked(df_all_raw, special_list, counts=None):
+    # counts: 可直接传入 (区县 × 产业集群) 计数表，如 AggregateCube.counts(...).unstack()
+    if counts is None:
+        df_spec = df_all_raw[df_all_raw['所属产业集群'].isin(special_list)]
+        counts = df_spec.groupby(['区县', '所属产业集群']).size().unstack()
+    geo_spec = counts.fillna(0)
+    fig, ax = new_figure(figsize=(12, 7))
+    if geo_spec.empty:  # 筛选后可能没有重点产业企业
+        ax.text(0.5, 0.5, '暂无重点产业企业', ha='center', va='center', fontproperties=my_font)
+    else:
+        geo_spec.plot(kind='bar', stacked=True, ax=ax, colormap='tab10')
     set_ax_font(ax, "重点科技产业之区县分布", "区县", "企业数量")
     return fig
 
 # 1.3 企业规模饼图
-def plot_scale_pie(df, title):
-    fig, ax = plt.subplots(figsize=(8, 8))
-    counts = df['企业划型名称'].value_counts()
-    ax.pie(counts, labels=counts.index, autopct='%1.1f%%', startangle=140, 
-           colors=sns.color_palette('pastel'),
-           textprops={'fontproperties': my_font})
+@plotter
+def plot_scale_pie(df, title, counts=None):
+    fig, ax = new_figure(figsize=(8, 8))
+    if counts is None: counts = df['企业划型名称'].value_counts()
+    counts = counts[counts > 0]  # 紧凑布局下为分类列，计数里会带出本切片没有的规模
+    if counts.sum() == 0:  # 部分工作簿缺少企业划型字段
+        ax.text(0.5, 0.5, '暂无企业规模数据', ha='center', va='center', fontproperties=my_font); ax.axis('off')
+    else:
+        ax.pie(counts, labels=counts.index, autopct='%1.1f%%', startangle=140, 
+               colors=sns.color_palette('pastel'),
+               textprops={'fontproperties': my_font})
     ax.set_title(title, fontproperties=my_font, fontweight='bold', fontsize=15)
     return fig
 
 # 1.4 成立年限直方图
-def plot_age_dist(df, title):
-    fig, ax = plt.subplots(figsize=(10, 6))
-    sns.histplot(df['企业年限'].dropna(), bins=15, kde=True, ax=ax, color='teal')
+@plotter
+def plot_age_dist(df, title, dist=None):
+    # dist: 可传入预计算的 HistKDE（如 ClusterProfile.dists.age），不再扫描原始行
+    fig, ax = new_figure(figsize=(10, 6))
+    draw_hist_kde(ax, dist or hist_kde(df['企业年限']), 'teal')
     set_ax_font(ax, title, "企业年限", "频数")
     return fig
 
 # 1.5 注册资本阶梯图
-def plot_capital_dist(df):
-    fig, ax = plt.subplots(figsize=(10, 7))
-    bins = [0, 100, 500, 1000, 5000, 10000, np.inf]
-    labels = ['<100万', '100-500万', '500-1000万', '1000-5000万', '5000万-1亿', '>1亿']
-    df['资本区间'] = pd.cut(df['注册资本_f'], bins=bins, labels=labels, include_lowest=True)
-    sns.countplot(x='资本区间', data=df, ax=ax, palette='Blues_r', hue='资本区间', legend=False)
+@plotter
+def plot_capital_dist(df, counts=None):
+    # counts: 可传入预计算的各资本区间企业数（如 ClusterProfile.capital_counts），不再对原始行分箱
+    fig, ax = new_figure(figsize=(10, 7))
+    if counts is None: counts = capital_counts(df['注册资本_f'])
+    sns.barplot(x=counts.index, y=counts.to_numpy(), ax=ax, palette='Blues_r', hue=counts.index, legend=False)
     set_ax_font(ax, '注册资本梯队分布 (单位: 万元)', "资本区间", "企业数量")
     return fig
 
 # 1.6 全市区县分布
-def plot_region_bar(df, title):
-    fig, ax = plt.subplots(figsize=(10, 6))
-    data = df['区县'].value_counts()
-    sns.barplot(x=data.values, y=data.index, palette='coolwarm', ax=ax)
+@plotter
+def plot_region_bar(df, title, counts=None):
+    fig, ax = new_figure(figsize=(10, 6))
+    data = df['区县'].value_counts() if counts is None else counts
+    # 紧凑布局下索引为分类：seaborn 会按类别顺序作图并画出全部类别，这里去掉空区县并按计数顺序固定
+    data = data[data > 0]
+    names = data.index.astype(str).tolist()
+    sns.barplot(x=data.to_numpy(), y=names, order=names, palette='coolwarm', ax=ax)
     set_ax_font(ax, title, "企业数量", "区县")
     return fig
 
 # 1.7 风险统计图
-def plot_risk_barh(df):
-    fig, ax = plt.subplots(figsize=(10, 7))
-    risk_cols = ['经营异常', '严重违法', '行政处罚', '被执行人', '失信被执行人', '对外担保', '股权出质']
-    risk_summary = df[risk_cols].apply(lambda x: (x == '是').sum()).sort_values()
+@plotter
+def plot_risk_barh(df, counts=None):
+    fig, ax = new_figure(figsize=(10, 7))
+    if counts is None: counts = pd.Series(risk_matrix(df).sum(axis=0), index=RISK_COLS)
+    risk_summary = counts.sort_values()
     risk_summary.plot(kind='barh', ax=ax, color='salmon')
     set_ax_font(ax, '企业风险项统计', "项数", "风险类别")
     return fig
 
 # 1.8 资质总量分布
-def plot_qual_dist(df):
-    fig, ax = plt.subplots(figsize=(10, 6))
-    sns.histplot(df['资质总量_f'], bins=15, kde=True, ax=ax, color='orange')
+@plotter
+def plot_qual_dist(df, dist=None):
+    fig, ax = new_figure(figsize=(10, 6))
+    draw_hist_kde(ax, dist or hist_kde(df['资质总量_f']), 'orange')
     set_ax_font(ax, '企业资质总量分布直方图', "资质总量", "频数")
     return fig
 
+# 1.9 产业交叉重叠热力图
+@plotter
+def plot_overlap_heatmap(matrix, title, fmt='d'):
+    # matrix: 产业 × 产业 的共有企业数或 Jaccard 相似度（ClusterOverlap.counts / .jaccard）
+    fig, ax = new_figure(figsize=(13, 11))
+    sns.heatmap(matrix, annot=True, fmt=fmt, cmap='YlGnBu', square=True, cbar_kws={'shrink': 0.7}, ax=ax,
+                annot_kws={'fontsize': 8})
+    set_ax_font(ax, title)
+    return fig
+
 # 2.1 指标回归趋势
-def plot_metric_trend(df_sub, col, label, r_val):
-    fig, ax = plt.subplots(figsize=(10, 6))
-    sns.regplot(x='专利数量_f', y=col, data=df_sub, ax=ax, scatter_kws={'alpha':0.4}, line_kws={'color':'#d62728'})
+@plotter
+def plot_metric_trend(df_sub, col, label, r_val=None):
+    fig, ax = new_figure(figsize=(10, 6))
+    fit = linear_fit(df_sub, '专利数量_f', col)
+    if r_val is None: r_val = round(fit.r, 2) if fit else 'NA'
+    ax.scatter(df_sub['专利数量_f'], df_sub[col], alpha=0.4)
+    draw_fit(ax, fit, '#d62728')
     ax.set_ylim(0, 110)
     set_ax_font(ax, f'【趋势】{label} vs 专利数量 (R={r_val})', "专利数量", label)
     return fig
 
 # 2.2 指标密度分布
-def plot_metric_violin(df_sub, col, label):
-    fig, ax = plt.subplots(figsize=(10, 6))
-    sns.violinplot(x='企业划型名称', y=col, data=df_sub, ax=ax, palette='Blues_r', cut=0, order=['大型','中型','小型','微型'])
+@plotter
+def plot_metric_violin(df_sub, col, label, stats=None):
+    # stats: 可传入各规模的 ViolinStats（如 ClusterProfile.dists.violins[col]）
+    order = ['大型', '中型', '小型', '微型']
+    if stats is None:
+        stats = {g: violin_stats(s) for g, s in df_sub.groupby('企业划型名称', observed=True)[col]}
+    fig, ax = new_figure(figsize=(10, 6))
+    for i, (group, color) in enumerate(zip(order, sns.color_palette('Blues_r', len(order)))):
+        v = stats.get(group)
+        if v is None: continue
+        if v.density is not None:
+            half = v.density / v.density.max() * 0.4
+            ax.fill_betweenx(v.grid, i - half, i + half, color=color, edgecolor='0.3', lw=1)
+        ax.vlines(i, v.lo, v.hi, color='0.25', lw=1.5)
+        ax.vlines(i, v.q1, v.q3, color='0.25', lw=5)
+        ax.scatter([i], [v.median], color='white', edgecolors='0.25', s=15, zorder=3)
+    ax.set_xticks(range(len(order)), order)
     ax.set_ylim(0, 110)
     set_ax_font(ax, f'【分布密度】{label} vs 企业规模', "企业规模", label)
     return fig
 
 # 3.1 研发聚焦气泡图
+@plotter
 def plot_bubble_chart(df_sub):
-    fig, ax = plt.subplots(figsize=(14, 9))
+    fig, ax = new_figure(figsize=(14, 9))
     ax.scatter(df_sub['支撑得分'], df_sub['护城河得分'], s=df_sub['专利数量_f'] * 3 + 30, alpha=0.6, c='#1f77b4', edgecolors='w')
-    sns.regplot(x='支撑得分', y='护城河得分', data=df_sub, scatter=False, color='#d62728', line_kws={'ls': '--'})
+    draw_fit(ax, linear_fit(df_sub, '支撑得分', '护城河得分'), '#d62728', ls='--')
     ax.set_ylim(0, 110); ax.set_xlim(0, 110)
     set_ax_font(ax, '研发聚焦度 vs. 技术护城河深度', "业务支撑指数(研发聚焦度)", "技术护城河深度")
     return fig
 
 # 4.1 融资对比箱线图
+@plotter
 def plot_funding_box(df_sub, col, title):
-    fig, ax = plt.subplots(figsize=(7, 7))
+    fig, ax = new_figure(figsize=(7, 7))
     sns.boxplot(x='是否融资', y=col, data=df_sub, ax=ax, palette=['#1f77b4', '#aec7e8'], order=['获投企业', '未获投'])
     ax.set_ylim(0, 110)
     set_ax_font(ax, title, "融资状态", col)
     return fig
 
 # 5.1 成立年限矩阵图
-def plot_age_matrix_row(df_sub, col, label):
+@plotter
+def plot_age_matrix_row(df_sub, col, label, means=None, dists=None):
+    # means: 可传入各梯队均值（如 AggregateCube.mean）；dists: 各梯队的 HistKDE（如 ClusterProfile.dists.age_rows[col]）
     age_order = ['青年企业(≤5年)', '中坚企业(6-15年)', '老牌企业(>15年)']
-    fig, axes = plt.subplots(1, 3, figsize=(18, 5))
+    if dists is None:
+        dists = {g: hist_kde(s, 'auto') for g, s in df_sub.groupby('年限梯队', observed=True)[col]}
+    fig, axes = new_figure(1, 3, figsize=(18, 5))
     for j, group in enumerate(age_order):
-        subset = df_sub[df_sub['年限梯队'] == group]
-        if not subset.empty:
-            sns.histplot(subset[col], kde=True, ax=axes[j], color='steelblue')
-            axes[j].axvline(subset[col].mean(), color='red', linestyle='--')
+        h = dists.get(group)
+        if h is not None and h.n:
+            draw_hist_kde(axes[j], h, 'steelblue')
+            axes[j].axvline(h.mean if means is None else means[group], color='red', linestyle='--')
             set_ax_font(axes[j], group, label, "频数")
             axes[j].set_xlim(0, 110)
     return fig
 
 # 5.2 时间趋势波动带状图
-def plot_time_trend_sd(df_sub, col, label, color):
-    fig, ax = plt.subplots(figsize=(12, 6))
-    sns.lineplot(data=df_sub, x='企业年限', y=col, ax=ax, color=color, marker='o', errorbar='sd')
+@plotter
+def plot_time_trend_sd(df_sub, col, label, color, band=None):
+    # band: 可传入预计算的 TrendBand（如 ClusterProfile.dists.trends[col]）
+    band = band or trend_band(df_sub, '企业年限', col)
+    fig, ax = new_figure(figsize=(12, 6))
+    ax.plot(band.x, band.mean, color=color, marker='o')
+    ax.fill_between(band.x, band.mean - band.sd, band.mean + band.sd, color=color, alpha=0.2, lw=0)
     ax.set_ylim(0, 110); ax.axvline(x=15, color='red', linestyle='--')
     set_ax_font(ax, f'{label} 随成立年限变化趋势', "企业年限", label)
     return fig
+
+# 6.1 跨数据版本的指标趋势
+@plotter
+def plot_snapshot_trend(trends, metric, clusters, title):
+    # trends: SnapshotStore.trends() 长表；每个产业一条折线，横轴为按保存顺序排列的快照
+    order = list(dict.fromkeys(trends['快照']))
+    fig, ax = new_figure(figsize=(12, 6))
+    for name, color in zip(clusters, sns.color_palette('tab10', len(clusters))):
+        sub = trends[trends['所属产业集群'] == name].set_index('快照').reindex(order)
+        ax.plot(range(len(order)), sub[metric].astype(float), marker='o', color=color, label=name,
+                lw=2.5 if name == '全市' else 1.5)
+    ax.set_xticks(range(len(order)), order)
+    ax.legend(prop=my_font, loc='best')
+    set_ax_font(ax, title, "数据版本", metric)
+    return fig
+
+# --- 4. 图像生命周期 ---
+def figure_bytes(fig, fmt="png", dpi=200):
+    """序列化图像；经 pyplot 创建的图像随后从全局注册表释放，避免长驻服务内存持续增长"""
+    try:
+        buf = io.BytesIO()
+        fig.savefig(buf, format=fmt, dpi=dpi, bbox_inches="tight")
+        return buf.getvalue()
+    finally:
+        if fig.canvas.manager is not None:
+            plt.close(fig)
+
+@contextmanager
+def managed_figures():
+    """兜底关闭块内新建但未释放的图像（如绘图中途抛出异常）"""
+    init_plotting()
+    before = set(plt.get_fignums())
+    try:
+        yield
+    finally:
+        for num in set(plt.get_fignums()) - before:
+            plt.close(num)
+
+# --- 5. 图像缓存层 ---
+def _func_token(func):
+    # 绘图函数身份 + 字节码，函数实现变更后磁盘缓存自动失效
+    func = getattr(func, "__wrapped__", func)
+    code = func.__code__
+    raw = f"{func.__module__}.{func.__qualname__}".encode() + code.co_code + repr(code.co_consts).encode()
+    return hashlib.sha1(raw).hexdigest()
+
+class FigureCache:
+    """按 (绘图函数, 参数, 数据指纹) 内容寻址的图像缓存：内存 LRU（按字节数限额）+ 可选磁盘持久化"""
+
+    def __init__(self, max_bytes=256 * 2**20, disk_dir=None, fmt="png", dpi=200):
+        self.max_bytes, self.disk_dir, self.fmt, self.dpi = max_bytes, disk_dir, fmt, dpi
+        self._items, self._size = OrderedDict(), 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def key(self, func, args, kwargs):
+        parts = [_func_token(func), self.fmt, str(self.dpi)]
+        parts += [frame_fingerprint(a) for a in args]
+        parts += [f"{k}={frame_fingerprint(v)}" for k, v in sorted(kwargs.items())]
+        return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+    def _put(self, key, data):
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes and len(self._items) > 1:
+                _, old = self._items.popitem(last=False)
+                self._size -= len(old)
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                return data
+        if self.disk_dir:
+            path = os.path.join(self.disk_dir, f"{key}.{self.fmt}")
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    data = f.read()
+                self._put(key, data)
+                return data
+        return None
+
+    def render(self, func, *args, **kwargs):
+        """返回图像字节；命中缓存时不调用 matplotlib"""
+        with span("cache_lookup", "figure_cache", func=func.__name__):
+            key = self.key(func, args, kwargs)
+            data = self.get(key)
+        if data is not None:
+            self.hits += 1
+            return data
+        self.misses += 1
+        with managed_figures():
+            with span(func.__name__, "visual_utils"):
+                fig = func(*args, **kwargs)
+            with span("savefig", "visual_utils", func=func.__name__, fmt=self.fmt):
+                data = figure_bytes(fig, self.fmt, self.dpi)
+        self._put(key, data)
+        if self.disk_dir:
+            path = os.path.join(self.disk_dir, f"{key}.{self.fmt}")
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+    def render_many(self, tasks, workers=None):
+        """并发渲染一组互不依赖的 task(...)，按传入顺序返回图像字节。
+
+        各图在独立的 Figure / Agg 画布上绘制，不共享 pyplot 状态；Agg 光栅化与 PNG 压缩期间释放 GIL，
+        多核主机上整体耗时接近最慢的一张图而非逐张累加。
+        """
+        tasks = list(tasks)
+        workers = workers or RENDER_WORKERS
+        if workers <= 1 or len(tasks) <= 1:
+            return [self.render(func, *args, **kwargs) for func, args, kwargs in tasks]
+        init_plotting()
+        with span("render_many", "figure_cache", n=len(tasks), workers=workers):
+            # 每个任务带一份提交方上下文的副本，渲染线程中的 span 归入发起本次重跑的会话
+            futures = [_render_pool(workers).submit(contextvars.copy_context().run, self.render, func, *args, **kwargs)
+                       for func, args, kwargs in tasks]
+            return [f.result() for f in futures]
+
+# 进程级默认缓存；设置 FIG_CACHE_DIR 环境变量即启用磁盘持久化
+figure_cache = FigureCache(disk_dir=os.environ.get("FIG_CACHE_DIR"))
+
+def render_cached(func, *args, **kwargs):
+    """经默认图像缓存渲染 plot_* 函数，返回 PNG 字节"""
+    return figure_cache.render(func, *args, **kwargs)
+
+# --- 6. 并发渲染 ---
+# 渲染线程数：RENDER_WORKERS 环境变量，默认 min(4, CPU 核数)；单核主机退化为顺序渲染
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", 0)) or min(4, os.cpu_count() or 1)
+_pools = {}
+
+def _render_pool(workers=RENDER_WORKERS):
+    """按线程数复用的渲染线程池（默认 RENDER_WORKERS；render_many 显式指定 workers 时另建一个）"""
+    with _init_lock:
+        if workers not in _pools:
+            _pools[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"render{workers}")
+        return _pools[workers]
+
+def task(func, *args, **kwargs):
+    """打包一次绘图调用，供 render_many 使用"""
+    return func, args, kwargs
+
+def render_many(tasks, workers=None):
+    """经默认图像缓存并发渲染多张图，按页面顺序返回 PNG 字节"""
+    return figure_cache.render_many(tasks, workers)